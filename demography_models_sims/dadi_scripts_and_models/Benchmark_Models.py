@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import json
+import socket
+import argparse
+import resource
+import subprocess
+import multiprocessing
+import numpy as np
+import dadi
+import Models_2D
+import Models_3D
+import Model_Specs
+import Model_Builder
+
+'''
+usage: python Benchmark_Models.py [--dims 2] [--models model12_anc_asym_mig_size ...]
+           [--pts 50,60,70 100,110,120] [--ns 91,215 144,66] [--extrap none make_extrap_func make_extrap_log_func]
+           [--repeat 3] [--history benchmark_history.jsonl] [--tolerance 1.25]
+
+Requires the Models_2D.py, Models_3D.py, Model_Specs.py and Model_Builder.py scripts
+to be in same working directory.
+
+Times the model functions of Models_2D.py and Models_3D.py for every combination of
+grid (pts), projection (ns) and extrapolation wrapper. "none" calls the model
+once on the largest grid size of pts; make_extrap_func and make_extrap_log_func
+call it through the dadi wrapper, on all grid sizes of pts. For each benchmark the
+script reports
+-wall time: the fastest of --repeat calls
+-peak RSS: maximum resident memory of the process running the benchmark. Every
+ benchmark runs in a fresh worker process, so this is the memory of that model
+ and grid alone
+-per-epoch breakdown: time spent in each integration step of the same model
+ compiled from its spec in Model_Specs.py (grid setup, ancestral phi, each epoch
+ and split, and the spectrum from phi), on the largest grid size.
+
+The phi cache of Model_Builder.py is switched off, so repeated calls do the full
+integration. Parameters are set by name: population sizes and migration rates to
+1, times to 0.5, so timings are comparable across models and runs, but not
+necessarily typical of optimized parameters.
+
+Results are appended to a history file, one JSON record per benchmark, with the
+date, host, git commit and python/numpy/dadi versions. Each new result is
+compared with the latest earlier record from the same host for the same model,
+grid, projection and wrapper, and flagged SLOWER if it takes more than
+--tolerance times as long.
+'''
+
+#======================================================================================
+# benchmark setup
+
+All_Specs = dict(list(Model_Specs.Two_Pop_Specs.items()) + list(Model_Specs.Three_Pop_Specs.items()))
+
+def Model_Function(model_name):
+    if model_name in Model_Specs.Two_Pop_Specs:
+        return getattr(Models_2D, model_name)
+    return getattr(Models_3D, model_name)
+
+def Benchmark_Params(model_name):
+    params = []
+    for name in All_Specs[model_name]["params"]:
+        if name.startswith("T"):
+            params.append(0.5)
+        else:
+            params.append(1.0)
+    return params
+
+def Model_Names(dims):
+    names = []
+    if 2 in dims:
+        names += sorted(Model_Specs.Two_Pop_Specs, key=Model_Number)
+    if 3 in dims:
+        names += sorted(Model_Specs.Three_Pop_Specs, key=Model_Number)
+    return names
+
+def Model_Number(model_name):
+    #model order in the model files: no_divergence first, then by model number
+    if not model_name.startswith("model"):
+        return 0
+    return int(model_name[5:].split("_")[0])
+
+#======================================================================================
+# worker side
+
+def Time_Epochs(model_name, params, ns, pts):
+    '''
+    Seconds spent in each step of the compiled model on grid size pts.
+    '''
+    spec = All_Specs[model_name]
+    plan = Model_Builder.Build_Plan(spec, params)
+    epochs = []
+    t0 = time.time()
+    xx = dadi.Numerics.default_grid(pts)
+    phi = dadi.PhiManip.phi_1D(xx)
+    phi = dadi.PhiManip.phi_1D_to_2D(xx, phi)
+    epochs.append({"step": "setup", "seconds": round(time.time() - t0, 4)})
+    for step in plan:
+        t0 = time.time()
+        phi = Model_Builder.Apply_Step(phi, xx, step)
+        if step[0] == "split":
+            epochs.append({"step": step[1], "seconds": round(time.time() - t0, 4)})
+        else:
+            epochs.append({"step": "epoch", "T": step[1], "seconds": round(time.time() - t0, 4)})
+    t0 = time.time()
+    dadi.Spectrum.from_phi(phi, ns, (xx,) * phi.ndim)
+    epochs.append({"step": "from_phi", "seconds": round(time.time() - t0, 4)})
+    return epochs
+
+def Run_Benchmark(task):
+    Model_Builder.prefix_cache_size = 0
+    record = {"model": task["model"], "ns": task["ns"], "pts": task["pts"], "extrap": task["extrap"]}
+    try:
+        params = Benchmark_Params(task["model"])
+        func = Model_Function(task["model"])
+        if task["extrap"] == "none":
+            func_exec = func
+            pts = max(task["pts"])
+        else:
+            func_exec = getattr(dadi.Numerics, task["extrap"])(func)
+            pts = task["pts"]
+        times = []
+        for rep in range(task["repeat"]):
+            t0 = time.time()
+            func_exec(params, task["ns"], pts)
+            times.append(time.time() - t0)
+        record["wall_seconds"] = round(min(times), 4)
+        if task["extrap"] == "none":
+            record["epochs"] = Time_Epochs(task["model"], params, task["ns"], max(task["pts"]))
+        record["status"] = "done"
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = "{0}: {1}".format(type(e).__name__, e)
+    #ru_maxrss is in kilobytes on linux
+    record["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+    return record
+
+#======================================================================================
+# history
+
+def Run_Info():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.STDOUT).decode().strip()
+    except Exception:
+        commit = "unknown"
+    return {"date": time.strftime("%Y-%m-%d %H:%M:%S"), "host": socket.gethostname(), "commit": commit,
+        "python": sys.version.split()[0], "numpy": np.__version__, "dadi": getattr(dadi, "__version__", "unknown")}
+
+def Benchmark_Key(record):
+    return (record["host"], record["model"], tuple(record["ns"]), tuple(record["pts"]), record["extrap"])
+
+def Read_History(history_name):
+    '''
+    Latest successful record for each benchmark key.
+    '''
+    latest = {}
+    if not os.path.exists(history_name):
+        return latest
+    for line in open(history_name, 'r'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            #partially written line from an interrupted run
+            continue
+        if record.get("status") == "done":
+            latest[Benchmark_Key(record)] = record
+    return latest
+
+def Int_List(text):
+    return [int(x) for x in text.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="time the dadi model functions across grids and projections")
+    parser.add_argument('--dims', dest='dims', type=int, nargs='+', default=[2], help='model files to benchmark: 2 (Models_2D.py) and/or 3 (Models_3D.py)')
+    parser.add_argument('--models', dest='models', type=str, nargs='+', default=None, help='model function names; default all models of --dims')
+    parser.add_argument('--pts', dest='pts', type=Int_List, nargs='+', default=[[50, 60, 70], [100, 110, 120]], help='grids, e.g. 50,60,70 100,110,120')
+    parser.add_argument('--ns', dest='ns', type=Int_List, nargs='+', default=None, help='projections, e.g. 91,215 144,66; default 91,215 144,66 for 2D and 20,20,20 for 3D models')
+    parser.add_argument('--extrap', dest='extrap', type=str, nargs='+', default=["none", "make_extrap_func", "make_extrap_log_func"], help='wrappers to benchmark')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=1, help='calls per benchmark; the fastest is reported')
+    parser.add_argument('--history', dest='history', type=str, default="benchmark_history.jsonl", help='history file results are appended to')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=1.25, help='flag results slower than this multiple of the previous result')
+    opts = parser.parse_args()
+
+    model_names = opts.models if opts.models is not None else Model_Names(opts.dims)
+    tasks = []
+    for model_name in model_names:
+        if opts.ns is not None:
+            projections = [ns for ns in opts.ns if len(ns) == (2 if model_name in Model_Specs.Two_Pop_Specs else 3)]
+        elif model_name in Model_Specs.Two_Pop_Specs:
+            projections = [[91, 215], [144, 66]]
+        else:
+            projections = [[20, 20, 20]]
+        for ns in projections:
+            for pts in opts.pts:
+                for extrap in opts.extrap:
+                    tasks.append({"model": model_name, "ns": ns, "pts": pts, "extrap": extrap, "repeat": opts.repeat})
+
+    info = Run_Info()
+    previous = Read_History(opts.history)
+    fh_history = open(opts.history, 'a')
+    print("{0} benchmarks, commit {1} on {2}".format(len(tasks), info["commit"], info["host"]))
+    print("model\tns\tpts\textrap\twall_seconds\tpeak_rss_mb\tprevious_seconds")
+
+    #one fresh process per benchmark, run one at a time so timings do not compete for cores
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        for record in pool.imap(Run_Benchmark, tasks):
+            record.update(info)
+            fh_history.write(json.dumps(record) + '\n')
+            fh_history.flush()
+            if record["status"] != "done":
+                print("{0}\t{1}\t{2}\t{3}\tfailed: {4}".format(record["model"], record["ns"], record["pts"], record["extrap"], record["error"]))
+                continue
+            last = previous.get(Benchmark_Key(record))
+            flag = ""
+            if last is not None and record["wall_seconds"] > opts.tolerance * last["wall_seconds"]:
+                flag = "\tSLOWER"
+            print("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}{7}".format(record["model"], record["ns"], record["pts"], record["extrap"],
+                record["wall_seconds"], record["peak_rss_mb"], last["wall_seconds"] if last is not None else "-", flag))
+    finally:
+        pool.close()
+        pool.join()
+        fh_history.close()
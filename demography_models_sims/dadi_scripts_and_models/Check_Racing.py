@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import dadi
+import Models_2D
+import Optimize_Parallel
+
+'''
+usage: python Check_Racing.py [--models no_divergence no_mig asym_mig anc_asym_mig] [--reps 20]
+           [--maxiter 20] [--rung-iter 2] [--seeds 1 2 3] [--pts 12,16,20] [--tolerance 1]
+
+Requires the Models_2D.py, Optimize_Parallel.py and Spectrum_Cache.py scripts to be
+in same working directory.
+
+Checks that a round raced with Optimize_Parallel.Run_Models_Racing() finds optima
+as good as an ordinary round run with Run_Models_Parallel(). A small folded
+spectrum is simulated from the asymmetric migration model (model3_asym_mig) with
+Poisson noise; for every seed, both kinds of round are run one replicate at a time
+with the same replicate seeds, in a temporary directory, and the best
+log-likelihood of each model is compared. For each seed and model the script
+prints the best log-likelihood of both rounds, and the wall time of each round.
+It exits with status 1 if the raced round of any model ends more than --tolerance
+log-likelihood units below the ordinary round.
+'''
+
+#======================================================================================
+# toy data
+
+True_Params = [0.5, 2, 1.0, 0.3, 0.4]
+
+def Toy_Spectrum(ns, seed):
+    model = dadi.Numerics.make_extrap_func(Models_2D.model3_asym_mig)(True_Params, ns, [20, 25, 30]) * 2000
+    data = np.random.RandomState(seed).poisson(model.clip(0, None))
+    return dadi.Spectrum(data, mask=model.mask).fold()
+
+def Best_Log_Likelihoods(journal_name, model_names):
+    records = Optimize_Parallel.Read_Journal(journal_name)
+    best = {}
+    for model_name in model_names:
+        lls = [Optimize_Parallel.Parse_Row(row)[0] for row in Optimize_Parallel.Done_Rows(records, model_name)]
+        lls = [ll for ll in lls if not np.isnan(ll)]
+        best[model_name] = max(lls) if len(lls) > 0 else float("nan")
+    return best
+
+def Int_List(text):
+    return [int(x) for x in text.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compare racing and ordinary optimization rounds on a simulated spectrum")
+    parser.add_argument('--models', dest='models', type=str, nargs='+', default=["no_divergence", "no_mig", "asym_mig", "anc_asym_mig"], help='model names of Optimize_Parallel.Two_Pop_Settings')
+    parser.add_argument('--reps', dest='reps', type=int, default=20, help='replicates per model')
+    parser.add_argument('--maxiter', dest='maxiter', type=int, default=20, help='maxiter of both rounds')
+    parser.add_argument('--rung-iter', dest='rung_iter', type=int, default=2, help='iterations of the first racing rung')
+    parser.add_argument('--eta', dest='eta', type=int, default=2, help='fraction 1/eta of the replicates kept at each rung')
+    parser.add_argument('--margin', dest='margin', type=float, default=None, help='log-likelihood margin of the race; default none')
+    parser.add_argument('--seeds', dest='seeds', type=int, nargs='+', default=[1, 2, 3], help='replicate seeds; one comparison per seed')
+    parser.add_argument('--pts', dest='pts', type=Int_List, default=[12, 16, 20], help='grid, e.g. 12,16,20')
+    parser.add_argument('--ns', dest='ns', type=Int_List, default=[10, 10], help='sample sizes of the simulated spectrum')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=1.0, help='allowed log-likelihood shortfall of the raced round')
+    opts = parser.parse_args()
+
+    fs = Toy_Spectrum(opts.ns, 3)
+    workdir = tempfile.mkdtemp(prefix="check_racing_")
+    cwd = os.getcwd()
+    failures = 0
+    try:
+        os.chdir(workdir)
+        print("seed\tmodel\tracing_ll\tparallel_ll\tdifference")
+        for seed in opts.seeds:
+            outfile = "seed{0}".format(seed)
+            t0 = time.time()
+            Optimize_Parallel.Run_Models_Racing(opts.pts, fs, outfile, opts.reps, opts.maxiter, opts.models,
+                round_label="Racing", processes=1, seed=seed, rung_iter=opts.rung_iter, eta=opts.eta, margin=opts.margin)
+            racing_seconds = time.time() - t0
+            t0 = time.time()
+            Optimize_Parallel.Run_Models_Parallel(opts.pts, fs, outfile, opts.reps, opts.maxiter, opts.models,
+                round_label="Parallel", processes=1, seed=seed)
+            parallel_seconds = time.time() - t0
+
+            racing = Best_Log_Likelihoods("Racing_{0}_journal.txt".format(outfile), opts.models)
+            parallel = Best_Log_Likelihoods("Parallel_{0}_journal.txt".format(outfile), opts.models)
+            for model_name in opts.models:
+                difference = racing[model_name] - parallel[model_name]
+                flag = ""
+                if not difference >= -opts.tolerance:
+                    flag = "\tWORSE"
+                    failures += 1
+                print("{0}\t{1}\t{2}\t{3}\t{4:.2f}{5}".format(seed, model_name, racing[model_name], parallel[model_name], difference, flag))
+            print("{0}\twall seconds\t{1:.1f}\t{2:.1f}".format(seed, racing_seconds, parallel_seconds))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+
+    if failures > 0:
+        print("{0} raced models ended more than {1} log-likelihood units below the ordinary round".format(failures, opts.tolerance))
+        sys.exit(1)
+    print("racing matched the ordinary rounds")
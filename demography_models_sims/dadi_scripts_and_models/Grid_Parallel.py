@@ -0,0 +1,79 @@
+import multiprocessing
+import numpy as np
+import dadi
+
+'''
+usage: import Grid_Parallel
+
+Extrapolating model functions that integrate the model at all grid sizes of pts at
+the same time. dadi.Numerics.make_extrap_func and make_extrap_log_func integrate
+the model at each grid size (e.g. pts = [100,110,120]) one after another before
+extrapolating; Parallel_Extrap() returns a function with the same (params, ns, pts)
+signature that hands each grid size to its own worker process and then
+extrapolates the spectra with the dadi wrapper itself, so results are identical to
+those of the serial wrapper:
+
+func_exec = Grid_Parallel.Parallel_Extrap(Models_2D.model12_anc_asym_mig_size, "make_extrap_func")
+sim_model = func_exec(params, fs.sample_sizes, pts)
+
+With one replicate per job on a node with idle cores this cuts the time of each
+likelihood evaluation to roughly that of the largest grid. Worker processes are
+started on the first call and kept, one pool per model function, for later calls
+and for later functions made by Parallel_Extrap() for the same model (e.g. one per
+optimization replicate); Close_Pools() stops them. The model function is handed to
+the workers when they start, so it does not need to be picklable (e.g. models
+compiled by Model_Builder.py), but workers must be forked (the default on linux).
+
+Daemonic processes, e.g. the workers of an Optimize_Parallel.py pool running
+several replicates at once, cannot start processes of their own; there the grid
+sizes are integrated one after another, as with the dadi wrappers.
+'''
+
+#model function of a grid worker, set when the worker starts
+_worker_func = {}
+
+#pools of grid workers, by (model function, processes)
+_pools = {}
+
+def _Init_Grid_Worker(func):
+    _worker_func['func'] = func
+
+def _Run_Grid(task):
+    params, ns, pts = task
+    return _worker_func['func'](params, ns, pts)
+
+def Parallel_Extrap(func, extrap="make_extrap_func", processes=None):
+    '''
+    Return a version of func that integrates each grid size of pts in its own
+    process and extrapolates with the dadi.Numerics wrapper named extrap
+    ("make_extrap_func" or "make_extrap_log_func"). processes defaults to the
+    number of grid sizes in pts.
+    '''
+    def parallel_func(params, ns, pts):
+        if np.isscalar(pts):
+            pts = [pts]
+        pts = [int(p) for p in pts]
+        tasks = [(params, ns, p) for p in pts]
+        if len(pts) == 1 or multiprocessing.current_process().daemon:
+            result_l = [func(*task) for task in tasks]
+        else:
+            key = (func, processes or len(pts))
+            if key not in _pools:
+                _pools[key] = multiprocessing.Pool(key[1], _Init_Grid_Worker, (func,))
+            result_l = _pools[key].map(_Run_Grid, tasks, chunksize=1)
+
+        #extrapolate with the dadi wrapper, looking up the spectra already computed
+        results = dict(zip(pts, result_l))
+        def computed(params, ns, pts):
+            return results[pts]
+        return getattr(dadi.Numerics, extrap)(computed)(params, ns, pts)
+
+    parallel_func.__name__ = func.__name__
+    parallel_func.__doc__ = func.__doc__
+    return parallel_func
+
+def Close_Pools():
+    for key in list(_pools):
+        pool = _pools.pop(key)
+        pool.close()
+        pool.join()
@@ -0,0 +1,142 @@
+import numbers
+from collections import OrderedDict
+from dadi import Numerics, PhiManip, Integration
+from dadi.Spectrum_mod import Spectrum
+
+'''
+usage: import Model_Builder
+
+Builds dadi model functions from a declarative description of the model, instead
+of writing out the sequence of two_pops/three_pops calls by hand. A model is a
+dictionary with the names of its parameters, in the order the optimizer passes
+them, and a list of events applied to the ancestral population after it splits
+into two:
+
+spec = {"params": ["nu1a", "nu2a", "nu1b", "nu2b", "m12", "m21", "T1", "T2"],
+        "events": [("epoch", "T1", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m12", "m21": "m21"}),
+                   ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b"})]}
+
+("epoch", T, rates):  integrate for time T with the population sizes and
+    migration rates in 'rates'. Values are parameter names or numbers; migration
+    rates that are left out are zero, and sizes that are left out are 1.
+("split", "split_1") or ("split", "split_2"):  split population 1 or 2 of a
+    two-population phi into a third population (PhiManip.phi_2D_to_3D_split_1/2).
+
+Compile(name, spec) returns a function with the usual (params, ns, pts)
+signature. On every call the spec is first resolved against the parameter values
+into an integration plan, which
+-drops epochs of length zero,
+-merges adjacent epochs with identical sizes and migration rates into one,
+-passes only the nonzero migration rates of each epoch to two_pops/three_pops,
+-reuses phi from a cache of plan prefixes, keyed by grid size and the resolved
+ steps, so the grid, the ancestral phi and any leading epochs whose parameters
+ did not change since an earlier call (of this or any other compiled model) are
+ not integrated again.
+Merging epochs changes the spectrum only by integration error; the other steps
+leave it unchanged.
+'''
+
+#number of intermediate phi kept in the prefix cache; set to 0 to disable it
+prefix_cache_size = 32
+_prefix_cache = OrderedDict()
+
+Two_Pop_Rates = ["nu1", "nu2", "m12", "m21"]
+Three_Pop_Rates = ["nu1", "nu2", "nu3", "m12", "m21", "m23", "m32", "m13", "m31"]
+
+def Resolve(value, values):
+    if isinstance(value, numbers.Number):
+        return float(value)
+    return float(values[value])
+
+def Build_Plan(spec, params):
+    '''
+    Resolve spec against a list of parameter values. Returns a tuple of steps,
+    ("epoch", T, ((rate name, value), ...)) or ("split", name).
+    '''
+    if len(params) != len(spec["params"]):
+        raise ValueError("expected {0} parameters, got {1}".format(len(spec["params"]), len(params)))
+    values = dict(zip(spec["params"], params))
+    npops = 2
+    plan = []
+    for event in spec["events"]:
+        if event[0] == "split":
+            npops = 3
+            plan.append(("split", event[1]))
+            continue
+        T = Resolve(event[1], values)
+        if T == 0:
+            continue
+        defaults = {"nu1": 1, "nu2": 1, "nu3": 1}
+        names = Two_Pop_Rates if npops == 2 else Three_Pop_Rates
+        rates = tuple([(n, Resolve(event[2].get(n, defaults.get(n, 0)), values)) for n in names])
+        if len(plan) > 0 and plan[-1][0] == "epoch" and plan[-1][2] == rates:
+            plan[-1] = ("epoch", plan[-1][1] + T, rates)
+        else:
+            plan.append(("epoch", T, rates))
+    return tuple(plan)
+
+def Apply_Step(phi, xx, step):
+    if step[0] == "split":
+        return getattr(PhiManip, "phi_2D_to_3D_" + step[1])(xx, phi)
+    #zero migration rates are left out of the call; they are the Integration defaults
+    rates = dict([(n, v) for n, v in step[2] if not (n.startswith("m") and v == 0)])
+    if "nu3" in rates:
+        return Integration.three_pops(phi, xx, step[1], **rates)
+    return Integration.two_pops(phi, xx, step[1], **rates)
+
+def Run_Plan(plan, ns, pts):
+    xx = Numerics.default_grid(pts)
+
+    #start from the longest cached prefix of the plan
+    start = None
+    for k in range(len(plan), -1, -1):
+        key = (pts, plan[:k])
+        if key in _prefix_cache:
+            phi = _prefix_cache.pop(key)
+            _prefix_cache[key] = phi
+            start = k
+            break
+    if start is None:
+        phi = PhiManip.phi_1D(xx)
+        phi = PhiManip.phi_1D_to_2D(xx, phi)
+        start = 0
+        _Store_Prefix((pts, ()), phi)
+
+    for k in range(start, len(plan)):
+        phi = Apply_Step(phi, xx, plan[k])
+        _Store_Prefix((pts, plan[:k + 1]), phi)
+
+    return Spectrum.from_phi(phi, ns, (xx,) * phi.ndim)
+
+def _Store_Prefix(key, phi):
+    if prefix_cache_size <= 0:
+        return
+    #integration and splits return new arrays, so cached phi are never modified
+    _prefix_cache[key] = phi
+    while len(_prefix_cache) > prefix_cache_size:
+        _prefix_cache.popitem(last=False)
+
+def Compile(name, spec):
+    '''
+    Build a dadi model function, func(params, ns, pts), from a model spec.
+    '''
+    for event in spec["events"]:
+        if event[0] not in ("epoch", "split"):
+            raise ValueError("{0}: unknown event {1}".format(name, event[0]))
+
+    def model_func(params, ns, pts):
+        return Run_Plan(Build_Plan(spec, params), ns, pts)
+
+    model_func.__name__ = name
+    model_func.__doc__ = "Compiled from spec: parameters [{0}]".format(", ".join(spec["params"]))
+    model_func.spec = spec
+    return model_func
+
+def Compile_All(specs, namespace):
+    '''
+    Compile every spec in a {name: spec} dictionary into namespace (e.g. globals()).
+    '''
+    for name in specs:
+        func = Compile(name, specs[name])
+        func.__module__ = namespace.get("__name__", func.__module__)
+        namespace[name] = func
@@ -0,0 +1,326 @@
+import Model_Builder
+
+'''
+usage: import Model_Specs
+
+Declarative versions of the models in Models_2D.py and Models_3D.py, compiled with
+Model_Builder.py into model functions of the same names, e.g.
+
+func_exec = dadi.Numerics.make_extrap_func(Model_Specs.model12_anc_asym_mig_size)
+
+Each spec lists the parameter names in the order the optimizer passes them, and the
+events after the split into two populations (see Model_Builder.py). Migration rates
+that are left out of an epoch are zero. To add a model, add a spec here; it is
+compiled when this module is imported.
+
+Requires the Model_Builder.py script to be in same working directory.
+'''
+
+##########################################################################################
+# Two population models (Models_2D.py)
+##########################################################################################
+
+Two_Pop_Specs = {
+    "no_divergence": {
+        "params": [],
+        "events": []},
+    "model1_no_mig": {
+        "params": ["nu1", "nu2", "T"],
+        "events": [
+            ("epoch", "T", {"nu1": "nu1", "nu2": "nu2"}),
+        ]},
+    "model2_sym_mig": {
+        "params": ["nu1", "nu2", "m", "T"],
+        "events": [
+            ("epoch", "T", {"nu1": "nu1", "nu2": "nu2", "m12": "m", "m21": "m"}),
+        ]},
+    "model3_asym_mig": {
+        "params": ["nu1", "nu2", "m12", "m21", "T"],
+        "events": [
+            ("epoch", "T", {"nu1": "nu1", "nu2": "nu2", "m12": "m12", "m21": "m21"}),
+        ]},
+    "model4_anc_sym_mig": {
+        "params": ["nu1", "nu2", "m", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nu2", "m12": "m", "m21": "m"}),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2"}),
+        ]},
+    "model5_anc_asym_mig": {
+        "params": ["nu1", "nu2", "m12", "m21", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nu2", "m12": "m12", "m21": "m21"}),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2"}),
+        ]},
+    "model6_sec_contact_sym_mig": {
+        "params": ["nu1", "nu2", "m", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nu2"}),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "m12": "m", "m21": "m"}),
+        ]},
+    "model7_sec_contact_asym_mig": {
+        "params": ["nu1", "nu2", "m12", "m21", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nu2"}),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "m12": "m12", "m21": "m21"}),
+        ]},
+    "model8_no_mig_size": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1a", "nu2": "nu2a"}),
+            ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b"}),
+        ]},
+    "model9_sym_mig_size": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "m", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m", "m21": "m"}),
+            ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b", "m12": "m", "m21": "m"}),
+        ]},
+    "model10_asym_mig_size": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "m12", "m21", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m12", "m21": "m21"}),
+            ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b", "m12": "m12", "m21": "m21"}),
+        ]},
+    "model11_anc_sym_mig_size": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "m", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m", "m21": "m"}),
+            ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b"}),
+        ]},
+    "model12_anc_asym_mig_size": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "m12", "m21", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m12", "m21": "m21"}),
+            ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b"}),
+        ]},
+    "model13_sec_contact_sym_mig_size": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "m", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1a", "nu2": "nu2a"}),
+            ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b", "m12": "m", "m21": "m"}),
+        ]},
+    "model14_sec_contact_asym_mig_size": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "m12", "m21", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1a", "nu2": "nu2a"}),
+            ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b", "m12": "m12", "m21": "m21"}),
+        ]},
+    "model15_anc_asym_mig_size_3epoch_gradient": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "nu1c", "nu2c", "m12", "m21", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m12", "m21": "m21"}),
+            ("epoch", "T1b", {"nu1": "nu1b", "nu2": "nu2b"}),
+            ("epoch", "T2", {"nu1": "nu1c", "nu2": "nu2c"}),
+        ]},
+    "model16_anc_asym_mig_size_3epoch_gradient_gflowdescent1": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "nu1c", "nu2c", "m12a", "m21a", "m12b", "m21b", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m12a", "m21": "m21a"}),
+            ("epoch", "T1b", {"nu1": "nu1b", "nu2": "nu2b", "m12": "m12b", "m21": "m21b"}),
+            ("epoch", "T2", {"nu1": "nu1c", "nu2": "nu2c"}),
+        ]},
+    "model17_anc_asym_mig_size_3epoch_gradient_gflowdescent2": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "m12a", "m21a", "m12b", "m21b", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m12a", "m21": "m21a"}),
+            ("epoch", "T1b", {"nu1": "nu1b", "nu2": "nu2b", "m12": "m12b", "m21": "m21b"}),
+            ("epoch", "T2", {"nu1": "nu1b", "nu2": "nu2b"}),
+        ]},
+    "model18_anc_asym_mig_size_3epoch_genflow_and_secondarycontact": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "nu1c", "nu2c", "m12", "m21", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m12", "m21": "m21"}),
+            ("epoch", "T1b", {"nu1": "nu1b", "nu2": "nu2b"}),
+            ("epoch", "T2", {"nu1": "nu1c", "nu2": "nu2c", "m12": "m12", "m21": "m21"}),
+        ]},
+    "model19_anc_asym_mig_size_3epoch_genflow_2levels_and_secondarycontact": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "nu1c", "nu2c", "m12a", "m21a", "m12b", "m21b", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1a", "nu2": "nu2a", "m12": "m12a", "m21": "m21a"}),
+            ("epoch", "T1b", {"nu1": "nu1b", "nu2": "nu2b"}),
+            ("epoch", "T2", {"nu1": "nu1c", "nu2": "nu2c", "m12": "m12b", "m21": "m21b"}),
+        ]},
+    "model20_anc_sym_mig_size_3epoch_genflow_2levels_and_secondarycontact": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "nu1c", "nu2c", "ma", "mb", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1a", "nu2": "nu2a", "m12": "ma", "m21": "ma"}),
+            ("epoch", "T1b", {"nu1": "nu1b", "nu2": "nu2b"}),
+            ("epoch", "T2", {"nu1": "nu1c", "nu2": "nu2c", "m12": "mb", "m21": "mb"}),
+        ]},
+    "model21_anc_asym_mig_size_3epoch_earlysecondarycontact": {
+        "params": ["nu1a", "nu2a", "nu1b", "nu2b", "nu1c", "nu2c", "m12", "m21", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1a", "nu2": "nu2a"}),
+            ("epoch", "T1b", {"nu1": "nu1b", "nu2": "nu2b", "m12": "m12", "m21": "m21"}),
+            ("epoch", "T2", {"nu1": "nu1c", "nu2": "nu2c"}),
+        ]},
+}
+
+##########################################################################################
+# Three population models (Models_3D.py); pops 1,2, and 3 are ECO,SW,SSAN
+##########################################################################################
+
+Three_Pop_Specs = {
+    "model22_split_nomig": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+        ]},
+    "model23_split_symmig_all": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "m1", "m2", "m3", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m2", "m13": "m3", "m31": "m3"}),
+        ]},
+    "model24_split_assymmig_all": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "m1", "m2", "m3", "m4", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m4", "m31": "m4"}),
+        ]},
+    "model25_ancmig_3": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("epoch", "T1b", {"nu1": "nu1", "nu2": "nuA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+        ]},
+    "model26_ancmig_2": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "T1", "T2"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+        ]},
+    "model27_ancmig_1": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "m1", "m2", "m3", "m4", "T1", "T2", "T3"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m4", "m31": "m4"}),
+            ("epoch", "T3", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+        ]},
+    "model28_ancmig_4": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "m1", "m2", "m3", "m4", "T1", "T2", "T3"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m4", "m31": "m4"}),
+            ("epoch", "T3", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m23": "m2", "m32": "m3"}),
+        ]},
+    "model29_ancmig_5": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "m1", "m2", "T1a", "T1b", "T2"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("epoch", "T1b", {"nu1": "nu1", "nu2": "nuA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m23": "m1", "m32": "m2"}),
+        ]},
+    "model30_ancmig_6": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "m1", "m2", "T1a", "T1b", "T2", "T3"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("epoch", "T1b", {"nu1": "nu1", "nu2": "nuA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m23": "m1", "m32": "m2"}),
+            ("epoch", "T3", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+        ]},
+    "model31_ancmig_7": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "mA", "m1", "m2", "m3", "T1", "T2", "T3", "T4"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m3", "m31": "m3"}),
+            ("epoch", "T3", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m23": "m2", "m32": "m3"}),
+            ("epoch", "T4", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+        ]},
+    "model32_split_symmig_all_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "m1", "m2", "m3", "T1", "T2", "T3"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m2", "m13": "m3", "m31": "m3"}),
+            ("epoch", "T3", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m2", "m13": "m3", "m31": "m3"}),
+        ]},
+    "model33_split_assymmig_all_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "m1", "m2", "m3", "m4", "T1", "T2", "T3"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m4", "m31": "m4"}),
+            ("epoch", "T3", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m4", "m31": "m4"}),
+        ]},
+    "model34_ancmig_3_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "T1a", "T1b", "T2", "T3"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("epoch", "T1b", {"nu1": "nu1", "nu2": "nuA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+            ("epoch", "T3", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b"}),
+        ]},
+    "model35_ancmig_2_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "T1", "T2", "T3"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+            ("epoch", "T3", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b"}),
+        ]},
+    "model36_ancmig_1_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "m1", "m2", "m3", "m4", "T1", "T2", "T3", "T4"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m4", "m31": "m4"}),
+            ("epoch", "T3", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+            ("epoch", "T4", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b"}),
+        ]},
+    "model37_ancmig_4_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "m1", "m2", "m3", "m4", "T1", "T2", "T3", "T4"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m4", "m31": "m4"}),
+            ("epoch", "T3", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m23": "m2", "m32": "m2"}),
+            ("epoch", "T4", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b", "m23": "m2", "m32": "m2"}),
+        ]},
+    "model38_ancmig_5_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "m1", "m2", "T1a", "T1b", "T2", "T3"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("epoch", "T1b", {"nu1": "nu1", "nu2": "nuA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m23": "m1", "m32": "m2"}),
+            ("epoch", "T3", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b", "m23": "m1", "m32": "m2"}),
+        ]},
+    "model39_ancmig_6_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "m1", "m2", "T1a", "T1b", "T2", "T3", "T4"],
+        "events": [
+            ("epoch", "T1a", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("epoch", "T1b", {"nu1": "nu1", "nu2": "nuA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m23": "m1", "m32": "m2"}),
+            ("epoch", "T3", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+            ("epoch", "T4", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b"}),
+        ]},
+    #Models_3D.py has m13=4 in the second epoch, here m13 is m4 as in the other ancmig_7/ancmig_1 models
+    "model40_ancmig_7_size": {
+        "params": ["nu1", "nuA", "nu2", "nu3", "nu1b", "nu2b", "nu3b", "mA", "m1", "m2", "m3", "m4", "T1", "T2", "T3", "T4", "T5"],
+        "events": [
+            ("epoch", "T1", {"nu1": "nu1", "nu2": "nuA", "m12": "mA", "m21": "mA"}),
+            ("split", "split_2"),
+            ("epoch", "T2", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m12": "m1", "m21": "m1", "m23": "m2", "m32": "m3", "m13": "m4", "m31": "m4"}),
+            ("epoch", "T3", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3", "m23": "m2", "m32": "m3"}),
+            ("epoch", "T4", {"nu1": "nu1", "nu2": "nu2", "nu3": "nu3"}),
+            ("epoch", "T5", {"nu1": "nu1b", "nu2": "nu2b", "nu3": "nu3b"}),
+        ]},
+}
+
+Model_Builder.Compile_All(Two_Pop_Specs, globals())
+Model_Builder.Compile_All(Three_Pop_Specs, globals())
@@ -0,0 +1,880 @@
+import os
+import multiprocessing
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import numpy as np
+import dadi
+import Models_2D
+import Spectrum_Cache
+
+'''
+usage: import Optimize_Parallel (from the dadi_2D_0*_optimization scripts)
+
+Requires the Models_2D.py and Spectrum_Cache.py scripts (and Grid_Parallel.py, for
+grid_processes > 1) to be in same working directory.
+
+Scheduler for the two-population optimization rounds. Rather than running the
+replicates of one model after another, every (model, replicate) pair is handed
+to a pool of worker processes, so all cores on a node stay busy until the last
+replicate of the last model is finished. Results are written back to the usual
+per-model output files:
+
+"Round{N}_[prefix]_[model_name]_optimized.txt"
+
+Rows are written in model order and then replicate order, regardless of which
+worker finishes first, so output files look exactly like the ones produced by
+calling Two_Pop_Models() once per model.
+
+Each replicate reseeds numpy from its own seed before perturbing the starting
+parameters. Forked workers would otherwise inherit the same random state and
+produce identical "replicates".
+
+Every finished replicate is also recorded in a journal file,
+
+"Round{N}_[prefix]_journal.txt"
+
+with one tab-delimited record per model/replicate: model name, replicate, seed,
+status ("done" or "failed") and the output row (or the error message). The
+journal is flushed to disk after each record. When a round script is rerun,
+replicates already marked done are skipped and only failed or missing ones are
+run again, so a killed cluster job or a crashed extrapolation only costs the
+replicates that were in progress. Output files of models found in the journal
+are rebuilt from it, with a single header line and rows in replicate order.
+Delete the journal to start a round from scratch.
+
+For fine grids run one replicate at a time (processes = 1) with grid_processes = 3:
+the three grid sizes of pts are then integrated at the same time on their own
+cores by Grid_Parallel.py, before extrapolation.
+
+Run_Multi_Fidelity() runs a round in two stages: many cheap replicates on a coarse
+grid (e.g. [50,60,70]), then only the best few distinct optima of each model are
+optimized again on a fine grid (e.g. [100,110,120]), so fine grid integrations are
+not spent on replicates the coarse grid already showed to be poor. Output files
+and journals of the stages are labeled "{round_label}_coarse" and
+"{round_label}_fine".
+
+Run_Models_Racing() races the replicates of each model (successive halving): all
+replicates run a few iterations, only the best 1/eta of them continue (fewer, if
+a margin is given and some trail the model's best replicate by more), and every
+rung spends as many iterations as the first, so the iterations of dropped
+replicates go to the survivors. The race ends with the model's best replicate,
+once it has had at least maxiter iterations. Poor replicates stop after a few
+iterations, while the winner gets many more iterations than a replicate of
+Run_Models_Parallel(). Each rung restarts the optimizer, with a fresh simplex,
+from the parameters the replicate stopped at.
+
+Run_Models_Adaptive() treats reps as a cap: replicates of a model stop being
+launched once its agree_n best replicates agree on log-likelihood and parameters,
+and the freed cores go to models that have not converged yet.
+
+Best_Params_From_Journal() reads the best replicate of every model from a round's
+journal, as the params_dict of the next round, instead of copying the parameters
+by hand. Run_Rounds_Pipelined() runs several rounds in one go: as soon as every
+replicate of a model has finished in one round, the next round of that model is
+started from its best replicate, without waiting for the other models.
+'''
+
+#======================================================================================
+# Settings shared by all optimization rounds. Starting parameters, perturbation fold
+# and the extrapolation function are supplied by each round's script.
+#
+# label:  model description written in the first column of the output
+# param_set:  parameter names written in the second column of the output
+# func:  model function in Models_2D.py
+# lower_bound, upper_bound:  search bounds for optimize_log_fmin
+# aic_k:  number of parameters counted in AIC
+
+Two_Pop_Settings = {
+    "no_divergence": {"label": "No divergence model",
+        "param_set": "parameter set = [none]",
+        "func": Models_2D.no_divergence,
+        "lower_bound": [], "upper_bound": [], "aic_k": 3},
+    "no_mig": {"label": "Divergence with no migration",
+        "param_set": "parameter set = [nu1, nu2, T]",
+        "func": Models_2D.model1_no_mig,
+        "lower_bound": [0.01, 0.01, 0], "upper_bound": [30, 30, 10], "aic_k": 3},
+    "sym_mig": {"label": "Divergence with symmetric migration",
+        "param_set": "parameter set = [nu1, nu2, m, T]",
+        "func": Models_2D.model2_sym_mig,
+        "lower_bound": [0.01, 0.01, 0.01, 0], "upper_bound": [30, 30, 20, 10], "aic_k": 4},
+    "asym_mig": {"label": "Divergence with asymmetric migration",
+        "param_set": "parameter set = [nu1, nu2, m12, m21, T]",
+        "func": Models_2D.model3_asym_mig,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0], "upper_bound": [30, 30, 20, 20, 10], "aic_k": 5},
+    "anc_sym_mig": {"label": "Divergence with ancient symmetrical migration",
+        "param_set": "parameter set = [nu1, nu2, m, T1, T2]",
+        "func": Models_2D.model4_anc_sym_mig,
+        "lower_bound": [0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 20, 10, 10], "aic_k": 5},
+    "anc_asym_mig": {"label": "Divergence with ancient asymmetrical migration",
+        "param_set": "parameter set = [nu1, nu2, m12, m21, T1, T2]",
+        "func": Models_2D.model5_anc_asym_mig,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 20, 20, 10, 10], "aic_k": 6},
+    "sec_contact_sym_mig": {"label": "Divergence and symmetrical secondary contact",
+        "param_set": "parameter set = [nu1, nu2, m, T1, T2]",
+        "func": Models_2D.model6_sec_contact_sym_mig,
+        "lower_bound": [0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 20, 10, 10], "aic_k": 5},
+    "sec_contact_asym_mig": {"label": "Divergence and asymmetrical secondary contact",
+        "param_set": "parameter set = [nu1, nu2, m12, m21, T1, T2]",
+        "func": Models_2D.model7_sec_contact_asym_mig,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 20, 20, 10, 10], "aic_k": 6},
+    "no_mig_size": {"label": "Divergence with no migration, size change",
+        "param_set": "parameter set = [nu1a, nu2a, nu1b, nu2b, T1, T2]",
+        "func": Models_2D.model8_no_mig_size,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 30, 30, 10, 10], "aic_k": 6},
+    "sym_mig_size": {"label": "Divergence with symmetric migration, size change",
+        "param_set": "parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]",
+        "func": Models_2D.model9_sym_mig_size,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 30, 30, 20, 10, 10], "aic_k": 7},
+    "asym_mig_size": {"label": "Divergence with asymmetric migration, size change",
+        "param_set": "parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]",
+        "func": Models_2D.model10_asym_mig_size,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 30, 30, 20, 20, 10, 10], "aic_k": 8},
+    "anc_sym_mig_size": {"label": "Divergence with ancient symmetrical migration, size change",
+        "param_set": "parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]",
+        "func": Models_2D.model11_anc_sym_mig_size,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 30, 30, 20, 10, 10], "aic_k": 7},
+    "anc_asym_mig_size": {"label": "Divergence with ancient asymmetrical migration, size change",
+        "param_set": "parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]",
+        "func": Models_2D.model12_anc_asym_mig_size,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 30, 30, 20, 20, 10, 10], "aic_k": 8},
+    "sec_contact_sym_mig_size": {"label": "Divergence and symmetrical secondary contact, size change",
+        "param_set": "parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]",
+        "func": Models_2D.model13_sec_contact_sym_mig_size,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 30, 30, 20, 10, 10], "aic_k": 7},
+    "sec_contact_asym_mig_size": {"label": "Divergence and asymmetrical secondary contact, size change",
+        "param_set": "parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]",
+        "func": Models_2D.model14_sec_contact_asym_mig_size,
+        "lower_bound": [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0, 0], "upper_bound": [30, 30, 30, 30, 20, 20, 10, 10], "aic_k": 8},
+}
+
+Output_Header = "Model"+'\t'+"param_set"+'\t'+"Replicate"+'\t'+"log-likelihood"+'\t'+"theta"+'\t'+"AIC"+'\t'+"optimized_params"+'\n'
+
+#the 15 models of the coarse grid rounds, in the order they are run
+Two_Pop_Model_Names = ["no_divergence", "no_mig", "sym_mig", "asym_mig", "anc_sym_mig", "anc_asym_mig",
+    "sec_contact_sym_mig", "sec_contact_asym_mig", "no_mig_size", "sym_mig_size",
+    "asym_mig_size", "anc_sym_mig_size", "anc_asym_mig_size", "sec_contact_sym_mig_size",
+    "sec_contact_asym_mig_size"]
+
+#======================================================================================
+# worker side
+
+#spectrum and run arguments shared by every task, set once per worker process
+_shared = {}
+
+def _Init_Worker(fs, pts, maxiter, verbose, grid_processes=1):
+    _shared['fs'] = fs
+    _shared['pts'] = pts
+    _shared['maxiter'] = maxiter
+    _shared['verbose'] = verbose
+    _shared['grid_processes'] = grid_processes
+
+def Run_Replicate(task):
+    '''
+    Run one optimization replicate and return the output row.
+    task is a dict with keys model_name, replicate, seed, params, fold and extrap.
+    '''
+    return Optimize_Replicate(task)[1]
+
+def Optimize_Replicate(task):
+    '''
+    Optimize one replicate; returns the unrounded optimized parameters and the
+    output row. Optional task keys: maxiter (default: the round's maxiter) and
+    perturb (default True; False continues from params as they are).
+    '''
+    fs = _shared['fs']
+    pts = _shared['pts']
+    settings = Two_Pop_Settings[task['model_name']]
+    lower_bound = settings['lower_bound']
+    upper_bound = settings['upper_bound']
+    params = task['params']
+
+    np.random.seed(task['seed'])
+
+    #create an extrapolating function; spectra are cached so the final evaluation at
+    #params_opt reuses the one the optimizer already computed
+    func_exec = Spectrum_Cache.Cached_Model(settings['func'], task['extrap'], grid_processes=_shared['grid_processes'])
+
+    if len(params) > 0:
+        #perturb initial guesses
+        if task.get('perturb', True):
+            params_perturbed = dadi.Misc.perturb_params(params, fold=task['fold'], upper_bound=upper_bound, lower_bound=lower_bound)
+        else:
+            params_perturbed = np.array(params)
+
+        #run optimization
+        params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts, lower_bound=lower_bound, upper_bound=upper_bound, verbose=_shared['verbose'], maxiter=task.get('maxiter', _shared['maxiter']))
+    else:
+        params_opt = []
+
+    #simulate the model with the optimized parameters
+    sim_model = func_exec(params_opt, fs.sample_sizes, pts)
+
+    #calculate likelihood, theta and AIC
+    ll = np.around(dadi.Inference.ll_multinom(sim_model, fs), 2)
+    theta = np.around(dadi.Inference.optimal_sfs_scaling(sim_model, fs), 2)
+    aic = ( -2*( float(ll))) + (2*settings['aic_k'])
+
+    fields = [settings['label'], settings['param_set'], task['replicate'], ll, theta, aic]
+    fields.extend([np.around(p, 4) for p in params_opt])
+    row = "".join(["{}\t".format(f) for f in fields]) + '\n'
+    return [float(p) for p in params_opt], row
+
+def Run_Task(task):
+    '''
+    Run_Replicate() for the pool. Errors (e.g. failed extrapolations) are caught
+    so they mark one replicate as failed instead of stopping the whole round.
+    Returns (model_name, replicate, seed, status, output row or error message).
+    '''
+    try:
+        row = Run_Replicate(task)
+    except Exception as e:
+        message = "{0}: {1}".format(type(e).__name__, e).replace('\t', ' ').replace('\n', ' ')
+        return task['model_name'], task['replicate'], task['seed'], "failed", message
+    return task['model_name'], task['replicate'], task['seed'], "done", row
+
+def Run_Rung_Task(task):
+    '''
+    Run_Task() for one rung of a racing round: returns (status, optimized
+    parameters, output row or error message).
+    '''
+    try:
+        params_opt, row = Optimize_Replicate(task)
+    except Exception as e:
+        message = "{0}: {1}".format(type(e).__name__, e).replace('\t', ' ').replace('\n', ' ')
+        return "failed", None, message
+    return "done", params_opt, row
+
+#======================================================================================
+# scheduler side
+
+def Build_Tasks(model_names, reps, params_dict, fold, extrap, seed=None):
+    '''
+    List every (model, replicate) pair in model order, then replicate order.
+    Replicate seeds are drawn from seed (or from fresh entropy when seed is None)
+    so a run can be repeated exactly. A params_dict entry may also be a list of
+    starting parameter lists, e.g. several optima from an earlier round; each
+    start then gets reps replicates, numbered consecutively.
+    '''
+    rng = np.random.RandomState(seed)
+    tasks = []
+    for model_name in model_names:
+        if params_dict is not None:
+            params = params_dict[model_name]
+        elif model_name == "no_divergence":
+            params = []
+        else:
+            params = [1] * len(Two_Pop_Settings[model_name]['lower_bound'])
+        if len(params) > 0 and np.iterable(params[0]):
+            starts = params
+        else:
+            starts = [params]
+        for i in range(1, int(reps) * len(starts) + 1):
+            tasks.append({'model_name': model_name, 'replicate': i, 'seed': int(rng.randint(0, 2**31 - 1)),
+                'params': list(starts[(i - 1) // int(reps)]), 'fold': fold, 'extrap': extrap})
+    return tasks
+
+def Read_Journal(journal_name):
+    '''
+    Return {(model_name, replicate): (seed, status, output row or error message)}
+    from a journal file, keeping the last record of each replicate.
+    '''
+    records = {}
+    if not os.path.exists(journal_name):
+        return records
+    fh_journal = open(journal_name, 'r')
+    for line in fh_journal:
+        fields = line.rstrip('\n').split('\t', 4)
+        #skip a partially written last line
+        if not line.endswith('\n') or len(fields) < 5:
+            continue
+        model_name, replicate, seed, status, rest = fields
+        records[(model_name, int(replicate))] = (int(seed), status, rest + '\n')
+    fh_journal.close()
+    return records
+
+def Open_Journal(journal_name):
+    '''
+    Open a journal for appending records, first cutting off a partially written
+    last line (left by a killed job) so the next record starts on its own line.
+    '''
+    if os.path.exists(journal_name):
+        fh_journal = open(journal_name, 'rb+')
+        content = fh_journal.read()
+        if len(content) > 0 and not content.endswith(b'\n'):
+            fh_journal.truncate(content.rfind(b'\n') + 1)
+        fh_journal.close()
+    return open(journal_name, 'a')
+
+def Append_Journal(fh_journal, model_name, replicate, seed, status, rest):
+    fh_journal.write("{0}\t{1}\t{2}\t{3}\t{4}\n".format(model_name, replicate, seed, status, rest.rstrip('\n')))
+    fh_journal.flush()
+    os.fsync(fh_journal.fileno())
+
+def Write_Output_From_Journal(outname, model_name, records):
+    '''
+    Rewrite one model's output file from the journal: header plus completed rows
+    in replicate order.
+    '''
+    done = sorted([(rep, rec[2]) for (name, rep), rec in records.items() if name == model_name and rec[1] == "done"])
+    fh_out = open(outname, 'w')
+    fh_out.write(Output_Header)
+    for rep, row in done:
+        fh_out.write(row)
+    fh_out.close()
+
+def Run_Models_Parallel(pts, fs, outfile, reps, maxiter, model_names, round_label="Round1", params_dict=None,
+        fold=3, extrap="make_extrap_func", processes=None, seed=None, verbose=0, grid_processes=1):
+    '''
+    Run reps optimization replicates of every model in model_names on a pool of
+    processes (default: all cores). params_dict maps model names to starting
+    parameters; when None, round 1 starting values of 1 are used. Rows are
+    streamed to "{round_label}_{outfile}_{model_name}_optimized.txt" in
+    replicate order, and every replicate is recorded in
+    "{round_label}_{outfile}_journal.txt" as soon as it finishes. Replicates the
+    journal already lists as done are not run again. With processes = 1,
+    grid_processes > 1 integrates the grid sizes of pts in parallel.
+    '''
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    journal_name = "{0}_{1}_journal.txt".format(round_label, outfile)
+    records = Read_Journal(journal_name)
+
+    #skip completed replicates; failed ones are retried from a fresh seed
+    rng = np.random.RandomState()
+    all_tasks = Build_Tasks(model_names, reps, params_dict, fold, extrap, seed)
+    tasks = []
+    for task in all_tasks:
+        record = records.get((task['model_name'], task['replicate']))
+        if record is not None and record[1] == "done":
+            continue
+        if record is not None and record[1] == "failed":
+            task['seed'] = int(rng.randint(0, 2**31 - 1))
+        tasks.append(task)
+
+    outnames = {}
+    pending = {}
+    for model_name in model_names:
+        outnames[model_name] = "{0}_{1}_{2}_optimized.txt".format(round_label, outfile, model_name)
+        pending[model_name] = [task['replicate'] for task in tasks if task['model_name'] == model_name]
+        if any(name == model_name for name, rep in records):
+            Write_Output_From_Journal(outnames[model_name], model_name, records)
+        elif not os.path.exists(outnames[model_name]) or os.path.getsize(outnames[model_name]) == 0:
+            fh_out = open(outnames[model_name], 'a')
+            fh_out.write(Output_Header)
+            fh_out.close()
+
+    print("Running {0} of {1} replicates of {2} models on {3} processes".format(len(tasks), len(all_tasks), len(model_names), processes))
+
+    if processes == 1:
+        _Init_Worker(fs, pts, maxiter, verbose, grid_processes)
+        results = (Run_Task(task) for task in tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, _Init_Worker, (fs, pts, maxiter, verbose, grid_processes))
+        #results are journaled as soon as they arrive, then held back until all
+        #earlier replicates of the same model are written to the output file
+        results = pool.imap_unordered(Run_Task, tasks, chunksize=1)
+
+    finished = {}
+    fh_journal = Open_Journal(journal_name)
+    try:
+        for model_name, replicate, task_seed, status, rest in results:
+            Append_Journal(fh_journal, model_name, replicate, task_seed, status, rest)
+            records[(model_name, replicate)] = (task_seed, status, rest)
+            finished[(model_name, replicate)] = (status, rest)
+            if status == "done":
+                print("{0} replicate {1}: {2}".format(model_name, replicate, rest.split('\t')[3]))
+            else:
+                print("{0} replicate {1} failed: {2}".format(model_name, replicate, rest))
+
+            waiting = pending[model_name]
+            fh_out = open(outnames[model_name], 'a')
+            while len(waiting) > 0 and (model_name, waiting[0]) in finished:
+                status, rest = finished.pop((model_name, waiting.pop(0)))
+                if status == "done":
+                    fh_out.write(rest)
+            fh_out.close()
+    finally:
+        fh_journal.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif grid_processes > 1:
+            import Grid_Parallel
+            Grid_Parallel.Close_Pools()
+
+    #put rows appended after a resume back in replicate order
+    for model_name in model_names:
+        if any(name == model_name for name, rep in records):
+            Write_Output_From_Journal(outnames[model_name], model_name, records)
+
+#======================================================================================
+# multi-fidelity rounds
+
+def Done_Rows(records, model_name):
+    '''
+    Output rows of a model's finished replicates in a journal, in replicate order.
+    '''
+    return [rec[2] for (name, rep), rec in sorted(records.items()) if name == model_name and rec[1] == "done"]
+
+def Parse_Row(row):
+    '''
+    Log-likelihood and optimized parameters of an output row.
+    '''
+    fields = row.rstrip('\n').split('\t')
+    return float(fields[3]), [float(f) for f in fields[6:] if f != ""]
+
+def Distinct_Optima(rows, top_k, rtol=0.05):
+    '''
+    Parameters of the top_k best rows (by log-likelihood) that are distinct
+    optima: rows whose parameters are all within rtol of a better row's are
+    treated as the same optimum and skipped.
+    '''
+    optima = []
+    for ll, params in sorted([Parse_Row(row) for row in rows], key=lambda r: -r[0]):
+        if np.isnan(ll):
+            continue
+        if any(np.allclose(params, other, rtol=rtol, atol=1e-4) for other in optima):
+            continue
+        optima.append(params)
+        if len(optima) == top_k:
+            break
+    return optima
+
+def Run_Multi_Fidelity(coarse_pts, fine_pts, fs, outfile, reps, maxiter, model_names, round_label="Round1",
+        params_dict=None, top_k=3, fine_reps=1, fold=3, fine_fold=1, extrap="make_extrap_func",
+        processes=None, seed=None, verbose=0, grid_processes=1, rtol=0.05):
+    '''
+    Screen every model with reps cheap replicates on coarse_pts, then promote
+    only the top_k distinct optima of each model to fine_pts, where fine_reps
+    replicates perturbed fine_fold-fold from each optimum are optimized again.
+    Both stages are ordinary Run_Models_Parallel() runs, labeled
+    "{round_label}_coarse" and "{round_label}_fine", with their own output files
+    and journals, so an interrupted run resumes where it stopped. Delete the fine
+    journal if the coarse stage is rerun with different settings.
+    '''
+    coarse_label = round_label + "_coarse"
+    Run_Models_Parallel(coarse_pts, fs, outfile, reps, maxiter, model_names, round_label=coarse_label,
+        params_dict=params_dict, fold=fold, extrap=extrap, processes=processes, seed=seed, verbose=verbose)
+
+    records = Read_Journal("{0}_{1}_journal.txt".format(coarse_label, outfile))
+    starts = {}
+    for model_name in model_names:
+        optima = Distinct_Optima(Done_Rows(records, model_name), top_k, rtol)
+        if len(optima) == 0:
+            print("{0}: no completed coarse grid replicates, not run on the fine grid".format(model_name))
+            continue
+        starts[model_name] = optima
+        print("{0}: {1} distinct optima promoted to the fine grid".format(model_name, len(optima)))
+
+    fine_names = [model_name for model_name in model_names if model_name in starts]
+    Run_Models_Parallel(fine_pts, fs, outfile, fine_reps, maxiter, fine_names, round_label=round_label + "_fine",
+        params_dict=starts, fold=fine_fold, extrap=extrap, processes=processes,
+        seed=None if seed is None else seed + 1, verbose=verbose, grid_processes=grid_processes)
+
+#======================================================================================
+# racing rounds
+
+def Run_Models_Racing(pts, fs, outfile, reps, maxiter, model_names, round_label="Round1", params_dict=None,
+        fold=3, extrap="make_extrap_func", processes=None, seed=None, verbose=0, grid_processes=1,
+        rung_iter=5, eta=2, margin=None):
+    '''
+    Successive halving version of Run_Models_Parallel(). All replicates are
+    optimized for rung_iter iterations; then, within each model, the best 1/eta
+    of the replicates (rounded up) are continued from where they stopped, and so
+    on. Every rung of a model spends the iterations of its first rung (rung_iter
+    per replicate), shared among the survivors, so halving the replicates
+    doubles the iterations of each survivor. The race of a model ends when a
+    single replicate is left and it has had at least maxiter iterations in
+    total. With n replicates and eta = 2 a race costs about
+    n * rung_iter * (log2(n) + 1) iterations, against n * maxiter for
+    Run_Models_Parallel(), so rung_iter should be well below
+    maxiter / (log2(n) + 1). Each rung restarts optimize_log_fmin from the
+    replicate's parameters with a fresh simplex, which costs some iterations per
+    rung; the winner's extra iterations make up for it (see Check_Racing.py).
+
+    If margin is given, replicates whose log-likelihood trails the model's best
+    replicate by more than margin are dropped as well. After a few iterations
+    log-likelihoods are still far apart, so a small margin can drop the
+    replicate that would have ended best.
+
+    The winner is written to the usual output file; dropped replicates are
+    recorded in the journal with status "dropped" and their log-likelihood at
+    the time, and replicates with a nan log-likelihood as failed. Once every
+    replicate of a model is journaled, its race is marked complete with a
+    record of replicate 0 with status "raced". Models marked complete are not
+    run again; a model interrupted during its race, even while its last rows
+    were being written, is raced again from the start.
+    '''
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    journal_name = "{0}_{1}_journal.txt".format(round_label, outfile)
+    records = Read_Journal(journal_name)
+    finished_models = set([name for (name, rep), rec in records.items() if rep == 0 and rec[1] == "raced"])
+    racing_names = [model_name for model_name in model_names if model_name not in finished_models]
+
+    outnames = {}
+    for model_name in model_names:
+        outnames[model_name] = "{0}_{1}_{2}_optimized.txt".format(round_label, outfile, model_name)
+        if model_name in finished_models:
+            Write_Output_From_Journal(outnames[model_name], model_name, records)
+
+    #seeds are drawn for every model, so a resumed race gives each model the seeds of a full run
+    alive = [task for task in Build_Tasks(model_names, reps, params_dict, fold, extrap, seed) if task['model_name'] in racing_names]
+    #iterations spent on each rung of a model, and iterations its survivors have had so far
+    budget = {}
+    used = {}
+    for model_name in racing_names:
+        budget[model_name] = rung_iter * len([task for task in alive if task['model_name'] == model_name])
+        used[model_name] = 0
+    print("Racing {0} replicates of {1} models on {2} processes".format(len(alive), len(racing_names), processes))
+
+    if processes == 1:
+        _Init_Worker(fs, pts, maxiter, verbose, grid_processes)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, _Init_Worker, (fs, pts, maxiter, verbose, grid_processes))
+
+    fh_journal = Open_Journal(journal_name)
+    try:
+        rung = 0
+        while len(alive) > 0:
+            for model_name in racing_names:
+                model_tasks = [task for task in alive if task['model_name'] == model_name]
+                if len(model_tasks) == 0:
+                    continue
+                rung_maxiter = int(np.ceil(budget[model_name] / float(len(model_tasks))))
+                for task in model_tasks:
+                    task['maxiter'] = rung_maxiter
+                    task['perturb'] = rung == 0
+                used[model_name] += rung_maxiter
+            if pool is None:
+                results = [Run_Rung_Task(task) for task in alive]
+            else:
+                results = pool.map(Run_Rung_Task, alive, chunksize=1)
+
+            survivors = []
+            for model_name in racing_names:
+                ranked = []
+                for task, (status, params_opt, rest) in zip(alive, results):
+                    if task['model_name'] != model_name:
+                        continue
+                    if status == "done" and np.isnan(Parse_Row(rest)[0]):
+                        status, rest = "failed", "log-likelihood is nan"
+                    if status == "failed":
+                        Append_Journal(fh_journal, model_name, task['replicate'], task['seed'], status, rest)
+                        continue
+                    ranked.append((Parse_Row(rest)[0], task, params_opt, rest))
+                ranked.sort(key=lambda r: -r[0])
+                #at least one replicate is dropped at every rung, until one is left
+                nkeep = max(1, min(len(ranked) - 1, int(np.ceil(len(ranked) / float(eta)))))
+                for rank, (ll, task, params_opt, rest) in enumerate(ranked):
+                    #models without parameters have nothing to optimize further
+                    if (len(ranked) == 1 and used[model_name] >= maxiter) or len(params_opt) == 0:
+                        Append_Journal(fh_journal, model_name, task['replicate'], task['seed'], "done", rest)
+                    elif rank < nkeep and (margin is None or ll >= ranked[0][0] - margin):
+                        task['params'] = params_opt
+                        survivors.append(task)
+                    else:
+                        Append_Journal(fh_journal, model_name, task['replicate'], task['seed'], "dropped", rest)
+            for model_name in racing_names:
+                if any(task['model_name'] == model_name for task in alive) and not any(task['model_name'] == model_name for task in survivors):
+                    Append_Journal(fh_journal, model_name, 0, 0, "raced", "")
+            print("Rung {0}: {1} of {2} replicates continue".format(rung + 1, len(survivors), len(alive)))
+            alive = survivors
+            rung += 1
+    finally:
+        fh_journal.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif grid_processes > 1:
+            import Grid_Parallel
+            Grid_Parallel.Close_Pools()
+
+    records = Read_Journal(journal_name)
+    for model_name in racing_names:
+        Write_Output_From_Journal(outnames[model_name], model_name, records)
+
+#======================================================================================
+# adaptive rounds
+
+def Converged(rows, agree_n, ll_tol=0.5, rtol=0.05):
+    '''
+    True when the agree_n best output rows are within ll_tol log-likelihood units
+    of the best row, with every parameter within rtol of the best row's.
+    '''
+    ranked = [r for r in [Parse_Row(row) for row in rows] if not np.isnan(r[0])]
+    if len(ranked) < agree_n:
+        return False
+    ranked.sort(key=lambda r: -r[0])
+    best_ll, best_params = ranked[0]
+    return all(best_ll - ll <= ll_tol and np.allclose(params, best_params, rtol=rtol, atol=1e-4) for ll, params in ranked[1:agree_n])
+
+def Submit_Task(pool, task, results, submitted):
+    '''
+    Run task on pool (or at once, when pool is None); its Run_Task() result is
+    put on the results queue as (key, result), with key (round, model_name,
+    replicate).
+    '''
+    key = (task.get('round', 0), task['model_name'], task['replicate'])
+    if pool is None:
+        results.put((key, Run_Task(task)))
+    else:
+        async_result = pool.apply_async(Run_Task, (task,), callback=lambda result: results.put((key, result)))
+        submitted[key] = (task, async_result)
+
+def Next_Result(results, submitted, poll=10):
+    '''
+    Next (round, Run_Task() result) of the tasks started by Submit_Task(). Tasks
+    that failed outside Run_Task (e.g. results that could not be pickled) never
+    reach the queue; the pending tasks are checked every poll seconds and those
+    are returned as failed records instead of waiting for them forever.
+    '''
+    while True:
+        try:
+            key, result = results.get(timeout=poll)
+            submitted.pop(key, None)
+            return key[0], result
+        except queue.Empty:
+            for key, (task, async_result) in list(submitted.items()):
+                if async_result.ready() and not async_result.successful():
+                    del submitted[key]
+                    try:
+                        async_result.get()
+                        message = "unknown error"
+                    except Exception as e:
+                        message = "{0}: {1}".format(type(e).__name__, e).replace('\t', ' ').replace('\n', ' ')
+                    return key[0], (task['model_name'], task['replicate'], task['seed'], "failed", message)
+
+def Run_Models_Adaptive(pts, fs, outfile, reps, maxiter, model_names, round_label="Round1", params_dict=None,
+        fold=3, extrap="make_extrap_func", processes=None, seed=None, verbose=0, grid_processes=1,
+        agree_n=3, ll_tol=0.5, rtol=0.05):
+    '''
+    Run_Models_Parallel() with an adaptive number of replicates per model.
+    Replicates are launched one at a time as cores become free, always for the
+    unconverged model with the fewest replicates so far, until the model
+    converges (Converged() on its finished replicates) or reps replicates have
+    been launched. Replicates already running when a model converges are
+    finished and kept. Seeds, output files and journal are those of
+    Run_Models_Parallel(), so rounds can be resumed, and replicate i of a model
+    is the same in both.
+    '''
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    journal_name = "{0}_{1}_journal.txt".format(round_label, outfile)
+    records = Read_Journal(journal_name)
+
+    #replicates still to run and finished rows, by model; failed replicates are retried from a fresh seed
+    rng = np.random.RandomState()
+    pending = dict([(model_name, []) for model_name in model_names])
+    rows = dict([(model_name, []) for model_name in model_names])
+    for task in Build_Tasks(model_names, reps, params_dict, fold, extrap, seed):
+        record = records.get((task['model_name'], task['replicate']))
+        if record is not None and record[1] == "done":
+            rows[task['model_name']].append(record[2])
+            continue
+        if record is not None and record[1] == "failed":
+            task['seed'] = int(rng.randint(0, 2**31 - 1))
+        pending[task['model_name']].append(task)
+
+    outnames = {}
+    running = {}
+    for model_name in model_names:
+        outnames[model_name] = "{0}_{1}_{2}_optimized.txt".format(round_label, outfile, model_name)
+        Write_Output_From_Journal(outnames[model_name], model_name, records)
+        running[model_name] = 0
+        if Converged(rows[model_name], agree_n, ll_tol, rtol):
+            pending[model_name] = []
+
+    print("Running up to {0} replicates of {1} models on {2} processes".format(sum([len(tasks) for tasks in pending.values()]), len(model_names), processes))
+
+    results = queue.Queue()
+    submitted = {}
+    if processes == 1:
+        _Init_Worker(fs, pts, maxiter, verbose, grid_processes)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, _Init_Worker, (fs, pts, maxiter, verbose, grid_processes))
+
+    fh_journal = Open_Journal(journal_name)
+    try:
+        nrunning = 0
+        while True:
+            while nrunning < processes:
+                candidates = [model_name for model_name in model_names if len(pending[model_name]) > 0]
+                if len(candidates) == 0:
+                    break
+                model_name = min(candidates, key=lambda m: len(rows[m]) + running[m])
+                task = pending[model_name].pop(0)
+                running[model_name] += 1
+                nrunning += 1
+                Submit_Task(pool, task, results, submitted)
+            if nrunning == 0:
+                break
+
+            r, (model_name, replicate, task_seed, status, rest) = Next_Result(results, submitted)
+            running[model_name] -= 1
+            nrunning -= 1
+            Append_Journal(fh_journal, model_name, replicate, task_seed, status, rest)
+            records[(model_name, replicate)] = (task_seed, status, rest)
+            if status == "done":
+                rows[model_name].append(rest)
+                print("{0} replicate {1}: {2}".format(model_name, replicate, rest.split('\t')[3]))
+            else:
+                print("{0} replicate {1} failed: {2}".format(model_name, replicate, rest))
+
+            if len(pending[model_name]) > 0 and Converged(rows[model_name], agree_n, ll_tol, rtol):
+                print("{0} converged after {1} replicates".format(model_name, len(rows[model_name])))
+                pending[model_name] = []
+            if running[model_name] == 0 and len(pending[model_name]) == 0:
+                Write_Output_From_Journal(outnames[model_name], model_name, records)
+    finally:
+        fh_journal.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif grid_processes > 1:
+            import Grid_Parallel
+            Grid_Parallel.Close_Pools()
+
+    for model_name in model_names:
+        state = "converged" if Converged(rows[model_name], agree_n, ll_tol, rtol) else "not converged"
+        print("{0}: {1} replicates, {2}".format(model_name, len(rows[model_name]), state))
+
+#======================================================================================
+# chained rounds
+
+def Best_Params(rows):
+    '''
+    Optimized parameters of the best output row (highest log-likelihood, so
+    lowest AIC within a model), or None if there are no rows.
+    '''
+    ranked = [r for r in [Parse_Row(row) for row in rows] if not np.isnan(r[0])]
+    if len(ranked) == 0:
+        return None
+    return max(ranked, key=lambda r: r[0])[1]
+
+def Best_Params_From_Journal(round_label, outfile, model_names):
+    '''
+    params_dict for the next round: the parameters of the best finished
+    replicate of every model in "{round_label}_{outfile}_journal.txt". Models
+    without finished replicates are left out.
+    '''
+    records = Read_Journal("{0}_{1}_journal.txt".format(round_label, outfile))
+    params_dict = {}
+    for model_name in model_names:
+        params = Best_Params(Done_Rows(records, model_name))
+        if params is not None:
+            params_dict[model_name] = params
+    return params_dict
+
+def Run_Rounds_Pipelined(pts, fs, outfile, model_names, rounds, params_dict=None, extrap="make_extrap_func",
+        processes=None, seed=None, verbose=0, grid_processes=1):
+    '''
+    Run consecutive optimization rounds, pipelined per model. rounds is a list
+    of dicts with keys round_label, reps, maxiter and fold (and optionally
+    extrap), e.g. {"round_label": "Round2", "reps": 50, "maxiter": 30, "fold": 2}.
+    The first round starts from params_dict (as in Run_Models_Parallel()); once
+    all replicates of a model have finished in a round, that model's next round
+    is queued, starting from its best replicate, while other models are still
+    running. Output files and journals are those of separate
+    Run_Models_Parallel() rounds (round r uses seed + r), so rounds already
+    finished in their journals are skipped when the pipeline is rerun.
+    '''
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    #tasks still to run, by (round, model); failed replicates are retried from a fresh seed
+    rng = np.random.RandomState()
+    records = []
+    journals = []
+    tasks = {}
+    outnames = {}
+    for r, settings in enumerate(rounds):
+        journal_name = "{0}_{1}_journal.txt".format(settings['round_label'], outfile)
+        records.append(Read_Journal(journal_name))
+        round_seed = None if seed is None else seed + r
+        for task in Build_Tasks(model_names, settings['reps'], None, settings['fold'], settings.get('extrap', extrap), round_seed):
+            record = records[r].get((task['model_name'], task['replicate']))
+            if record is not None and record[1] == "done":
+                continue
+            if record is not None and record[1] == "failed":
+                task['seed'] = int(rng.randint(0, 2**31 - 1))
+            task['maxiter'] = settings['maxiter']
+            task['round'] = r
+            tasks.setdefault((r, task['model_name']), []).append(task)
+        for model_name in model_names:
+            outnames[(r, model_name)] = "{0}_{1}_{2}_optimized.txt".format(settings['round_label'], outfile, model_name)
+            Write_Output_From_Journal(outnames[(r, model_name)], model_name, records[r])
+        journals.append(Open_Journal(journal_name))
+
+    ready = []
+    outstanding = {}
+
+    def Queue_Model(model_name, r):
+        #skip rounds this model already finished in an earlier run
+        while r < len(rounds) and len(tasks.get((r, model_name), [])) == 0:
+            r += 1
+        if r == len(rounds):
+            return
+        if r == 0:
+            params = None if params_dict is None else params_dict[model_name]
+        else:
+            params = Best_Params(Done_Rows(records[r - 1], model_name))
+            if params is None:
+                print("{0}: no finished replicates in {1}, later rounds not run".format(model_name, rounds[r - 1]['round_label']))
+                return
+        for task in tasks[(r, model_name)]:
+            if params is not None:
+                task['params'] = list(params)
+            ready.append(task)
+        outstanding[(r, model_name)] = len(tasks[(r, model_name)])
+
+    for model_name in model_names:
+        Queue_Model(model_name, 0)
+
+    print("Running {0} rounds of {1} models on {2} processes".format(len(rounds), len(model_names), processes))
+
+    results = queue.Queue()
+    submitted = {}
+    if processes == 1:
+        _Init_Worker(fs, pts, rounds[0]['maxiter'], verbose, grid_processes)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, _Init_Worker, (fs, pts, rounds[0]['maxiter'], verbose, grid_processes))
+
+    try:
+        nrunning = 0
+        while True:
+            while nrunning < processes and len(ready) > 0:
+                task = ready.pop(0)
+                nrunning += 1
+                Submit_Task(pool, task, results, submitted)
+            if nrunning == 0:
+                break
+
+            r, (model_name, replicate, task_seed, status, rest) = Next_Result(results, submitted)
+            nrunning -= 1
+            Append_Journal(journals[r], model_name, replicate, task_seed, status, rest)
+            records[r][(model_name, replicate)] = (task_seed, status, rest)
+            if status == "done":
+                print("{0} {1} replicate {2}: {3}".format(rounds[r]['round_label'], model_name, replicate, rest.split('\t')[3]))
+            else:
+                print("{0} {1} replicate {2} failed: {3}".format(rounds[r]['round_label'], model_name, replicate, rest))
+
+            outstanding[(r, model_name)] -= 1
+            if outstanding[(r, model_name)] == 0:
+                Write_Output_From_Journal(outnames[(r, model_name)], model_name, records[r])
+                Queue_Model(model_name, r + 1)
+    finally:
+        for fh_journal in journals:
+            fh_journal.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        elif grid_processes > 1:
+            import Grid_Parallel
+            Grid_Parallel.Close_Pools()
@@ -3,15 +3,18 @@ import os
 import numpy as np
 import dadi
 import pylab
-import Models_2D
+import Optimize_Parallel
+import VcfToSpectrum
 from datetime import datetime
 import matplotlib.pyplot as plt
 
 '''
 usage: python dadi_2D_01_first_optimizations.py
 
-Requires the Models_2D.py script to be in same working directory. This is where
-all the population model functions are stored for this script. 
+Requires the Models_2D.py, Optimize_Parallel.py and Spectrum_Cache.py scripts, and
+VcfToSpectrum.py and ConvertVcfToDadi.py from utilities, to be in same working
+directory. Models_2D.py is where all the population model functions are stored,
+and Optimize_Parallel.py runs the replicates of every model on a pool of processes.
 
 Script will perform optimizations from multiple starting points using a
 3-fold perturbed set of random starting values for parameters. The output for
@@ -66,967 +69,25 @@ t_begin = datetime.now()
 #**************
 snps1 = "dadi_input_20171010_124725_SWP_SFOR.tsv"
 
-#Create python dictionary from snps file
-dd1 = dadi.Misc.make_data_dict(snps1)
-
 #**************
 #pop_ids is a list which should match the populations headers of your SNPs file columns
 pop_ids=["SFOR", "SWP"]
 #projection sizes, in ALLELES not individuals
 proj_1 = [144,66]
 
-#Convert this dictionary into folded AFS object
-#[polarized = False] creates folded spectrum object
-fs_1 = dadi.Spectrum.from_data_dict(dd1, pop_ids=pop_ids, projections = proj_1, polarized = False)
+#Create folded AFS object directly from the snps file, as from_data_dict with [polarized = False];
+#the spectrum is cached in spectrum_cache, so later runs and rounds skip parsing the snps file
+fs_1 = VcfToSpectrum.CachedSpectrum(snps1, pop_ids, proj_1)
 
 print '\n', '\n', "Data for spectrum:"
 print "projection", proj_1
 print "sample sizes", fs_1.sample_sizes
 print "Segregating sites",fs_1.S(), '\n', '\n'
 
-#======================================================================================
-#create function to run models with user input parameters (presumably from best runs)
-#run optimization 'x' times on perturbed best starting params
-
-def Two_Pop_Models(pts, fs, outfile, reps, y, model_name):
-    print '\n',"============================================================================"
-    print "Beginning analysis of {}".format(model_name)
-    print "============================================================================"
-
-    #create output file
-    outname = "Round1_{0}_{1}_optimized.txt".format(outfile,model_name)
-    fh_out = open(outname, 'a')
-    fh_out.write("Model"+'\t'+"param_set"+'\t'+"Replicate"+'\t'+"log-likelihood"+'\t'+"theta"+'\t'+"AIC"+'\t'+"optimized_params"+'\n')
-    fh_out.close()
-    
-    #variable to control number of loops per model (1 to x)
-    x = int(reps) + int(1)
-        
-    if model_name == "no_divergence":
-        #####################################
-        #No Divergence
-        #####################################
-        print "---------------------------------------------------"
-        print "No Divergence",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.no_divergence
-        params = []
-        print "parameter set = [none]"
-        
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-        
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("No divergence model"+'\t')
-            fh_out.write("parameter set = [none]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params, fs.sample_sizes, pts)
-            
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*3)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-            
-            fh_out.write('\n')
-            fh_out.close()
-
-        print "---------------------------------------------------", '\n'
-
-        
-    elif model_name == "no_mig":
-        fh_out = open(outname, 'a')
-        #####################################
-        # Divergence with no migration
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with no migration",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.no_mig
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0]
-        upper_bound = [30, 30, 10]
-        params = [1,1,1]
-        print "parameter set = [nu1, nu2, T]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with no migration"+'\t')
-            fh_out.write("parameter set = [nu1, nu2, T]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*3)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-        
-    elif model_name == "sym_mig":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence with symmetric migration
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with symmetric migration",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.sym_mig
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0]
-        upper_bound = [30, 30, 20, 10]
-        params = [1,1,1,1]
-        print "parameter set = [nu1, nu2, m, T]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with symmetric migration"+'\t')
-            fh_out.write("parameter set = [nu1, nu2, m, T]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*4)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-        
-    elif model_name == "asym_mig":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence with asymmetric migration
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with asymmetric migration",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.asym_mig
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0]
-        upper_bound = [30, 30, 20, 20, 10]
-        params = [1,1,1,1,1]
-        print "parameter set = [nu1, nu2, m12, m21, T]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with asymmetric migration"+'\t')
-            fh_out.write("parameter set = [nu1, nu2, m12, m21, T]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*5)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-        
-    elif model_name == "anc_sym_mig":
-        fh_out = open(outname, 'a') 
-        #####################################
-        #Divergence with ancient symmetrical migration
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with ancient symmetrical migration",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.anc_sym_mig
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 20, 10, 10]
-        params = [1,1,1,1,1]
-        print "parameter set = [nu1, nu2, m, T1, T2]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with ancient symmetrical migration"+'\t')
-            fh_out.write("parameter set = [nu1, nu2, m, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-            
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*5)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-        
-    elif model_name == "anc_asym_mig":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence with ancient asymmetrical migration
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with ancient asymmetrical migration",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.anc_asym_mig
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 20, 20, 10, 10]
-        params = [1,1,1,1,1,1]
-        print "parameter set = [nu1, nu2, m12, m21, T1, T2]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with ancient asymmetrical migration"+'\t')
-            fh_out.write("parameter set = [nu1, nu2, m12, m21, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*6)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-        
-    elif model_name == "sec_contact_sym_mig":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence and symmetrical secondary contact
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence and symmetrical secondary contact",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.sec_contact_sym_mig
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 20, 10, 10]
-        params = [1,1,1,1,1]
-        print "parameter set = [nu1, nu2, m, T1, T2]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence and symmetrical secondary contact"+'\t')
-            fh_out.write("parameter set = [nu1, nu2, m, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*5)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-        
-        
-    elif model_name == "sec_contact_asym_mig":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence and asymmetrical secondary contact
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence and asymmetrical secondary contact",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.sec_contact_asym_mig
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 20, 20, 10, 10]
-        params = [1,1,1,1,1,1]
-        print "parameter set = [nu1, nu2, m12, m21, T1, T2]"
-        
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence and asymmetrical secondary contact"+'\t')
-            fh_out.write("parameter set = [nu1, nu2, m12, m21, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*6)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-
-    ##########################################################################
-    #Similar models but with size change allowed
-    ##########################################################################
-    
-    elif model_name == "no_mig_size":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence with no migration, size change
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with no migration, size change",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.no_mig_size
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 30, 30, 10, 10]
-        params = [1,1,1,1,1,1]
-        print "parameter set = [nu1a, nu2a, nu1b, nu2b, T1, T2]"
- 
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with no migration, size change"+'\t')
-            fh_out.write("parameter set = [nu1a, nu2a, nu1b, nu2b, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*6)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-        
-        
-    elif model_name == "sym_mig_size":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence with symmetric migration, size change
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with symmetric migration, size change",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.sym_mig_size
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 30, 30, 20, 10, 10]
-        params = [1,1,1,1,1,1,1]
-        print "parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]"
- 
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with symmetric migration, size change"+'\t')
-            fh_out.write("parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*7)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-        
-
-    elif model_name == "asym_mig_size":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence with asymmetric migration, size change
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with asymmetric migration, size change",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.asym_mig_size
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 30, 30, 20, 20, 10, 10]
-        params = [1,1,1,1,1,1,1,1]
-        print "parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]"
- 
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with asymmetric migration, size change"+'\t')
-            fh_out.write("parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*8)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
- 
- 
-    elif model_name == "anc_sym_mig_size":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence with ancient symmetrical migration, size change
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with ancient symmetrical migration, size change",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.anc_sym_mig_size
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 30, 30, 20, 10, 10]
-        params = [1,1,1,1,1,1,1]
-        print "parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with ancient symmetrical migration, size change"+'\t')
-            fh_out.write("parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*7)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-        
-    elif model_name == "anc_asym_mig_size":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence with ancient asymmetrical migration, size change
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence with ancient asymmetrical migration, size change",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.anc_asym_mig_size
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 30, 30, 20, 20, 10, 10]
-        params = [1,1,1,1,1,1,1,1]
-        print "parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence with ancient asymmetrical migration, size change"+'\t')
-            fh_out.write("parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*8)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-
-    elif model_name == "sec_contact_sym_mig_size":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence and symmetrical secondary contact, size change
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence and symmetrical secondary contact, size change",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.sec_contact_sym_mig_size
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 30, 30, 20, 10, 10]
-        params = [1,1,1,1,1,1,1]
-        print "parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]"
-
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence and symmetrical secondary contact, size change"+'\t')
-            fh_out.write("parameter set = [nu1a, nu2a, nu1b, nu2b, m, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*7)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-
-           
-    elif model_name == "sec_contact_asym_mig_size":
-        fh_out = open(outname, 'a')
-        #####################################
-        #Divergence and asymmetrical secondary contact, size change
-        #####################################
-        print "---------------------------------------------------"
-        print "Divergence and asymmetrical secondary contact, size change",'\n','\n'
-
-        #first call a predefined model
-        model_call = Models_2D.sec_contact_asym_mig_size
-
-        #create an extrapolating function 
-        func_exec = dadi.Numerics.make_extrap_func(model_call)
-
-        #create parameter list for optimization, set bounds for search
-        lower_bound = [0.01, 0.01, 0.01, 0.01, 0.01, 0.01, 0, 0]
-        upper_bound = [30, 30, 30, 30, 20, 20, 10, 10]
-        params = [1,1,1,1,1,1,1,1]
-        print "parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]"
-    
-        for i in range(1,x):
-            fh_out = open(outname, 'a')
-            fh_out.write("Divergence and asymmetrical secondary contact, size change"+'\t')
-            fh_out.write("parameter set = [nu1a, nu2a, nu1b, nu2b, m12, m21, T1, T2]"+'\t')
-            fh_out.write("{}\t".format(i))
-            print '\n', "Replicate {}:".format(i)
-
-            #perturb initial guesses
-            params_perturbed = dadi.Misc.perturb_params(params, fold=3, upper_bound=upper_bound, lower_bound=lower_bound)
-
-            #run optimization 
-            params_opt = dadi.Inference.optimize_log_fmin(params_perturbed, fs, func_exec, pts,lower_bound=lower_bound, upper_bound=upper_bound, verbose=1, maxiter=y)
-            print '\n',"optimized parameters = ", params_opt
-            
-            #simulate the model with the optimized parameters
-            sim_model = func_exec(params_opt, fs.sample_sizes, pts)
-
-            #calculate likelihood
-            ll = dadi.Inference.ll_multinom(sim_model, fs)
-            ll = np.around(ll, 2)
-            print "likelihood = ", ll
-            fh_out.write("{}\t".format(ll))
-
-            #calculate theta
-            theta = dadi.Inference.optimal_sfs_scaling(sim_model, fs)
-            theta = np.around(theta, 2)
-            print "Theta = ", theta
-            fh_out.write("{}\t".format(theta))
-
-            #calculate AIC 
-            aic = ( -2*( float(ll))) + (2*8)
-            print "AIC = ", aic, '\n', '\n'
-            fh_out.write("{}\t".format(aic))
-
-            for p in params_opt:
-                p = np.around(p, 4)
-                fh_out.write("{}\t".format(p))
-            fh_out.write('\n')
-            fh_out.close()
-        print "---------------------------------------------------", '\n'
-        
-    
-        
-
 #======================================================================================
 # Finally, execute model with appropriate arguments
-# Two_Pop_Models(pts, fs, outfile, reps, maxiter, model_name):
+# Optimize_Parallel.Run_Models_Parallel(pts, fs, outfile, reps, maxiter, model_names, round_label,
+#        params_dict, fold, extrap, processes, grid_processes):
 
 # pts:  grid choice (list of three numbers, ex. [20,30,40]
 
@@ -1038,11 +99,35 @@ def Two_Pop_Models(pts, fs, outfile, reps, y, model_name):
 
 # maxiter:  max number of iterations per optimization step (not intuitive! see dadi user group)
 
-# model_name:  "no_divergence", "no_mig", "sym_mig", "asym_mig", "anc_sym_mig", "anc_asym_mig",
+# model_names:  list of any of "no_divergence", "no_mig", "sym_mig", "asym_mig", "anc_sym_mig", "anc_asym_mig",
 #        "sec_contact_sym_mig", "sec_contact_asym_mig", "no_mig_size", "sym_mig_size",
 #        "asym_mig_size", "anc_sym_mig_size", "anc_asym_mig_size", "sec_contact_sym_mig_size",
 #        "sec_contact_asym_mig_size"
 
+# round_label:  "Round1", "Round2" or "Round3", used in output naming
+
+# fold:  how many fold to perturb starting parameters for each replicate
+
+# extrap:  "make_extrap_func" or "make_extrap_log_func"
+
+# processes:  number of worker processes, None uses every core on the node
+
+# grid_processes:  processes integrating the grid sizes of pts in parallel for each replicate,
+#        used when processes = 1 (e.g. 3 for one fine grid replicate per job)
+
+# Optimize_Parallel.Run_Models_Racing(..., rung_iter, eta, margin) takes the same arguments as
+#        Run_Models_Parallel, and races the replicates of each model (see Optimize_Parallel.py)
+
+# Optimize_Parallel.Run_Models_Adaptive(..., agree_n, ll_tol, rtol) takes the same arguments as
+#        Run_Models_Parallel, and runs up to reps replicates of each model, until its best ones agree
+
+# Optimize_Parallel.Run_Rounds_Pipelined(pts, fs, outfile, model_names, rounds, extrap, processes) runs
+#        the rounds listed in rounds one after another for each model, each from the previous round's best
+
+# Optimize_Parallel.Run_Multi_Fidelity(pts, fine_pts, fs, outfile, reps, maxiter, model_names, round_label,
+#        top_k, fine_reps, fold, fine_fold, extrap, processes) runs reps replicates on pts, then
+#        fine_reps replicates from each of the top_k distinct optima of every model on fine_pts
+
 
 
 #===========================================================================
@@ -1053,35 +138,62 @@ fs = fs_1
 outfile = "SwpVsSf_coarsegrid"
 reps = int(50)
 maxiter = int(20)
+#number of worker processes, None uses every core on the node
+processes = None
+#processes integrating the three grid sizes of pts at once, with processes = 1
+grid_processes = 1
+#set racing = True to keep only the better half of each model's replicates after rounds of
+#rung_iter, 2*rung_iter, ... iterations, until the best one is left and has had at least maxiter;
+#a margin (in log-likelihood units) also drops replicates trailing the best by more than that
+racing = False
+rung_iter = 2
+margin = None
+#set adaptive = True to treat reps as a cap, and stop launching replicates of a model once its
+#agree_n best replicates agree within ll_tol log-likelihood units and rtol in every parameter
+adaptive = False
+agree_n = 3
+ll_tol = 0.5
+rtol = 0.05
+#set multi_fidelity = True to refine the top_k distinct optima of each model on fine_pts
+multi_fidelity = False
+fine_pts = [100,110,120]
+top_k = 3
 
 
 #===========================================================================
-# Two_Pop_Models(pts, fs, outfile, reps, maxiter, model_name, params):
-
-# Here it is set up to call each model one by one sequentially, which could finish relatively quickly.
-# If it takes too long, create multiple verisions of this script, block out some models (use hashes or delete),
-# and execute one version for every core you have available. It will greatly speed up these steps,
-# and sometimes if extrapolations fail the script will crash too and this could prevent it from
-# happening too many times.
+# Every (model, replicate) pair below is handed to a pool of 'processes' workers, so
+# one copy of this script keeps every core on the node busy; there is no need to make
+# copies of it for each core. Rows are still written to one output file per model, in
+# replicate order. To skip models, remove them from model_names.
+# Finished replicates are recorded in "RoundN_[prefix]_journal.txt"; if the job is killed
+# or some replicates fail, just rerun this script and only the missing or failed replicates
+# will be run again. Delete the journal to start over.
 # There are 15 models to test here. 
 
-
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "no_divergence")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "no_mig")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "sym_mig")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "asym_mig")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "anc_sym_mig")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "anc_asym_mig")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "sec_contact_sym_mig")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "sec_contact_asym_mig")
-
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "no_mig_size")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "sym_mig_size")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "asym_mig_size")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "anc_sym_mig_size")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "anc_asym_mig_size")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "sec_contact_sym_mig_size")
-Two_Pop_Models(pts, fs, outfile, reps, maxiter, "sec_contact_asym_mig_size")
+model_names = Optimize_Parallel.Two_Pop_Model_Names
+
+#set pipeline_rounds = True to run rounds 1-3 in one go: each model's next round starts from its
+#best replicate as soon as all of its replicates have finished, without waiting for other models
+pipeline_rounds = False
+rounds = [{"round_label": "Round1", "reps": 50, "maxiter": 20, "fold": 3},
+    {"round_label": "Round2", "reps": 50, "maxiter": 30, "fold": 2},
+    {"round_label": "Round3", "reps": 100, "maxiter": 50, "fold": 1}]
+
+if pipeline_rounds:
+    Optimize_Parallel.Run_Rounds_Pipelined(pts, fs, outfile, model_names, rounds, extrap="make_extrap_func",
+        processes=processes, grid_processes=grid_processes)
+elif multi_fidelity:
+    Optimize_Parallel.Run_Multi_Fidelity(pts, fine_pts, fs, outfile, reps, maxiter, model_names, round_label="Round1",
+        top_k=top_k, fine_reps=1, fold=3, fine_fold=1, extrap="make_extrap_func", processes=processes, grid_processes=grid_processes)
+elif racing:
+    Optimize_Parallel.Run_Models_Racing(pts, fs, outfile, reps, maxiter, model_names, round_label="Round1",
+        fold=3, extrap="make_extrap_func", processes=processes, grid_processes=grid_processes, rung_iter=rung_iter, margin=margin)
+elif adaptive:
+    Optimize_Parallel.Run_Models_Adaptive(pts, fs, outfile, reps, maxiter, model_names, round_label="Round1",
+        fold=3, extrap="make_extrap_func", processes=processes, grid_processes=grid_processes, agree_n=agree_n, ll_tol=ll_tol, rtol=rtol)
+else:
+    Optimize_Parallel.Run_Models_Parallel(pts, fs, outfile, reps, maxiter, model_names, round_label="Round1",
+        fold=3, extrap="make_extrap_func", processes=processes, grid_processes=grid_processes)
 
 
 #===========================================================================
@@ -0,0 +1,114 @@
+import os
+import hashlib
+from collections import OrderedDict
+import numpy
+import dadi
+
+'''
+usage: import Spectrum_Cache
+
+Memoized model spectra. Wrapping a model function with Cached_Model() returns a
+function with the usual (params, ns, pts) signature that remembers the spectra it
+has computed, keyed by model function (name and a digest of its code), extrapolation,
+parameter values (rounded to 'digits' significant digits), projection and grid:
+
+func_exec = Spectrum_Cache.Cached_Model(Models_2D.model12_anc_asym_mig_size, "make_extrap_func")
+sim_model = func_exec(params_opt, fs.sample_sizes, pts)
+
+The most recent 'maxsize' spectra are kept in memory. If a cache_dir is given,
+every spectrum is also written there as a dadi .fs file named by the hash of its
+key, so separate runs (e.g. the simulation scripts) reuse spectra computed before
+instead of integrating the model again.
+
+Spectra are returned as copies, so callers may modify them freely.
+'''
+
+def Spectrum_Key(func_name, extrap, params, ns, pts, digits=10):
+    '''
+    Hashable key for one model evaluation. Parameters are rounded to 'digits'
+    significant digits so values that went through log/exp in the optimizer still
+    match.
+    '''
+    rounded = tuple([float("{0:.{1}g}".format(float(p), digits)) for p in params])
+    sizes = tuple([int(n) for n in ns])
+    if numpy.iterable(pts):
+        grid = tuple([int(p) for p in pts])
+    else:
+        grid = int(pts)
+    return (func_name, extrap, rounded, sizes, grid)
+
+def Key_Hash(key):
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+def Code_Digest(func):
+    '''
+    Digest of a model function's bytecode and constants (and of its spec, for
+    models compiled by Model_Builder.py), so spectra cached on disk are not
+    reused after the model is edited. Functions the model calls are not
+    included.
+    '''
+    sha = hashlib.sha1()
+    codes = [func.__code__]
+    while len(codes) > 0:
+        code = codes.pop(0)
+        sha.update(code.co_code)
+        for const in code.co_consts:
+            #nested functions: digest their code, as their repr contains a memory address
+            if hasattr(const, 'co_code'):
+                codes.append(const)
+            else:
+                sha.update(repr(const).encode('utf-8'))
+    sha.update(repr(getattr(func, 'spec', None)).encode('utf-8'))
+    return sha.hexdigest()[:12]
+
+def Cached_Model(func, extrap=None, maxsize=64, cache_dir=None, digits=10, grid_processes=1):
+    '''
+    Return a caching version of func. extrap is the name of a dadi.Numerics
+    extrapolation wrapper ("make_extrap_func" or "make_extrap_log_func"), or None
+    to call func directly with a single grid size. With grid_processes > 1 the grid
+    sizes are integrated in parallel by Grid_Parallel.py, with identical results.
+    '''
+    if extrap is None:
+        func_exec = func
+    elif grid_processes > 1:
+        import Grid_Parallel
+        func_exec = Grid_Parallel.Parallel_Extrap(func, extrap, grid_processes)
+    else:
+        func_exec = getattr(dadi.Numerics, extrap)(func)
+    func_name = "{0}.{1}:{2}".format(func.__module__, func.__name__, Code_Digest(func))
+    memory = OrderedDict()
+    if cache_dir is not None and not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    def cached_func(params, ns, pts):
+        key = Spectrum_Key(func_name, extrap, params, ns, pts, digits)
+        if key in memory:
+            fs = memory.pop(key)
+            memory[key] = fs
+            cached_func.hits += 1
+            return fs.copy()
+
+        fs = None
+        if cache_dir is not None:
+            fs_name = os.path.join(cache_dir, Key_Hash(key) + ".fs")
+            if os.path.exists(fs_name):
+                fs = dadi.Spectrum.from_file(fs_name)
+                cached_func.hits += 1
+        if fs is None:
+            fs = func_exec(params, ns, pts)
+            cached_func.misses += 1
+            if cache_dir is not None:
+                #write then rename, so other processes never read a partial file
+                tmp_name = "{0}.{1}.tmp".format(fs_name, os.getpid())
+                fs.to_file(tmp_name)
+                os.rename(tmp_name, fs_name)
+
+        memory[key] = fs
+        if len(memory) > maxsize:
+            memory.popitem(last=False)
+        return fs.copy()
+
+    cached_func.hits = 0
+    cached_func.misses = 0
+    cached_func.__name__ = func.__name__
+    return cached_func
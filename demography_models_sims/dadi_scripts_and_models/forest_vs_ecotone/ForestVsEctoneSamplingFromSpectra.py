@@ -1,63 +1,59 @@
 import dadi
 import numpy
-from Models_2D import anc_asym_mig_size
-
-def Create2dsfsIndexingArray(sfs):
-    rows,columns =  sfs.shape
-    indexing_list = []
-    for i in range(rows):
-        for j in range(columns):
-            indexing_list.append([i+1,j+1])
-    index_array = numpy.array(indexing_list)
-    return index_array
-
-def SampleSfs(indexarray,probs,nsamples=56055):
-    samples =  numpy.random.choice(19872,size=nsamples,p=probs)
-    allele_combo = []
-    for sample in samples:
-        allele_combo.append(indexarray[sample,])
-    return allele_combo 
+import Spectrum_Cache
+import VcfToSpectrum
+import SfsSampling
+import RandomStreams
+from Models_2D import model12_anc_asym_mig_size
+
 ### 1. load empirical data ###
 snps1 = "/n/holylfs/LABS/informatics/adamf/trachylpeis_rad/dadi/dadi_forVseco_input_20170915_141444.tsv"
 
-### 2.make dadi data dictionary from empirical data file ###
-dd1 = dadi.Misc.make_data_dict(snps1)
-
-### 3. provide populations labels ###
+### 2. provide populations labels ###
 pop_ids=["ECO", "FOR"]
 
-### 4. provide downward projection of number of alleles assayed ###
+### 3. provide downward projection of number of alleles assayed ###
 proj_1 = [91,215]
 
-### 5. create 2D SFS from data dictionary, ids, and projection data ###
-fs_1 = dadi.Spectrum.from_data_dict(dd1, pop_ids=pop_ids, projections = proj_1, polarized = False)
+### 4. create 2D SFS from empirical data file, ids, and projection data; cached in spectrum_cache ###
+fs_1 = VcfToSpectrum.CachedSpectrum(snps1, pop_ids, proj_1)
 
-### 6. normalize 2D observation counts by sum of 2D SFS to get approximate probabilities of occurence
-fs_probs = fs_1/numpy.sum(fs_1)
-fs_probs_1d =  fs_probs.reshape(19872,)
-fs_probs_1d = numpy.ma.filled(fs_probs_1d,0)
-index_array = Create2dsfsIndexingArray(fs_1)
+### 5. normalize 2D observation counts by sum of 2D SFS to get approximate probabilities of occurence
+fs_probs = SfsSampling.SpectrumProbabilities(fs_1)
 
-### sample sfs
-samples = SampleSfs(index_array,fs_probs_1d)
-fout = open('sim_allele_counts.txt','w')
-fout.write('ECO\tFOR\n')
-for sample in samples:
-   fout.write('%s\t%s\n' % (sample[0],sample[1]))
+### number of simulated data sets per spectrum; with more than one, output files get a _rep{n} suffix
+nreplicates = 1
+
+### sampling mode: 'snps' writes one line of allele counts per simulated SNP; 'counts' draws one multinomial
+### count vector over the spectrum and writes one line per occupied cell, with the number of SNPs in a 'count' column
+sampling_mode = 'snps'
+nsnps = 56055
 
-fout.close()
+### random seed; each replicate of the empirical and model spectra gets its own stream, so a replicate
+### can be regenerated on its own. Set to the seed printed by an earlier run to repeat it
+seed = None
+if seed is None:
+    seed = RandomStreams.NewSeed()
+print('random seed: %s' % seed)
+
+def SimulateReplicate(probs,outname,rng):
+    if sampling_mode == 'counts':
+        cells,counts = SfsSampling.SampleSfsCounts(probs,nsnps,rng)
+        SfsSampling.WriteCellCounts(outname.replace('.txt','_cellcounts.txt'),cells,counts,pop_ids)
+    else:
+        SfsSampling.WriteAlleleCounts(outname,SfsSampling.SampleSfs(probs,nsnps,rng),pop_ids)
+
+### sample sfs
+for rep in range(1,nreplicates+1):
+    SimulateReplicate(fs_probs,SfsSampling.ReplicateName('sim_allele_counts.txt',rep,nreplicates),RandomStreams.Stream(seed,'empirical',rep))
 
 ### MODEL 
 best_model_params = [0.1009, 0.5933, 29.9198, 8.7145, 1.1616, 0.4132, 5.3655, 0.0269]
 #pts = [100,110,120]
 pts=120
+### the model spectrum is cached on disk, so reruns with the same parameters skip the integration
+anc_asym_mig_size = Spectrum_Cache.Cached_Model(model12_anc_asym_mig_size, cache_dir='spectrum_cache')
 modelsfs = anc_asym_mig_size(best_model_params, proj_1, pts)
-modelprobs = modelsfs/numpy.sum(modelsfs)
-modelprobs = modelprobs.reshape(19872,)
-modelprobs = numpy.ma.filled(modelprobs,0)
-model_samples = SampleSfs(index_array,modelprobs)
-modelout = open('modelsim_alelle_counts.txt','w')
-modelout.write('ECO\tFOR\n')
-for sample in model_samples:
-   modelout.write('%s\t%s\n' % (sample[0],sample[1]))
-modelout.close()
+modelprobs = SfsSampling.SpectrumProbabilities(modelsfs)
+for rep in range(1,nreplicates+1):
+    SimulateReplicate(modelprobs,SfsSampling.ReplicateName('modelsim_alelle_counts.txt',rep,nreplicates),RandomStreams.Stream(seed,'model',rep))
@@ -1,63 +1,91 @@
-from numpy.random import rand
+import sys
+import numpy
 import argparse
-from collections import defaultdict
+import subprocess
+import RandomStreams
 
 def ExtractAlleleFrequenciesFromCounts(dadialleles_pop1,dadialleles_pop2,variantcount1,variantcount2):
     pop1 = variantcount1/float(dadialleles_pop1)
     pop2 = variantcount2/float(dadialleles_pop2)
     return pop1,pop2
 
-def GenerateGenotypesFromFrequencies(freq1,freq2,gtypes1,gtypes2):
-    gtypes = defaultdict(list)
-    for i in range(gtypes1):
-       alleles = []
-       for j in range(2):
-            if freq1 <= rand():
-                alleles.append('1')
-            else:
-                alleles.append('0')
-       alleles.sort()
-       gtypes['pop1'].append('/'.join(alleles))
+def ReadAlleleCounts(sfsname):
+    # returns an (nlines, 3) array of pop1 count, pop2 count and number of SNPs; tables written in 'counts'
+    # sampling mode have a third column with the number of SNPs in each spectrum cell, otherwise each line is one SNP
+    counts = numpy.loadtxt(sfsname,dtype=int,skiprows=1,ndmin=2)
+    if counts.shape[1] == 2:
+        counts = numpy.column_stack((counts,numpy.ones(len(counts),dtype=int)))
+    return counts
 
-    for i in range(gtypes2):
-       alleles = []
-       for j in range(2):
-            if freq2 <= rand():
-                alleles.append('1')
-            else:
-                alleles.append('0')
-       alleles.sort()
-       gtypes['pop2'].append('/'.join(alleles))
-    
-    return gtypes        
+def GenerateGenotypesFromFrequencies(freq1,freq2,gtypes1,gtypes2,rng=numpy.random):
+    # returns an int8 (nsnps, gtypes1+gtypes2) matrix with the number of '1' alleles of every diploid. As in the
+    # original per-allele draws (allele is '1' when freq <= rand()), each allele is '1' with probability 1-freq;
+    # counts above the allele number (freq > 1, from the +1 spectrum index) give all '0' alleles, as before
+    dosages1 = rng.binomial(2,numpy.clip(1-numpy.asarray(freq1,dtype=float),0,1)[:,None],size=(len(freq1),gtypes1))
+    dosages2 = rng.binomial(2,numpy.clip(1-numpy.asarray(freq2,dtype=float),0,1)[:,None],size=(len(freq2),gtypes2))
+    return numpy.hstack((dosages1,dosages2)).astype(numpy.int8)
 
-def CalcMafFromGtypes(gtype_dict):
-    alleles = ''
-    for pop in gtype_dict:
-        for gtype in gtype_dict[pop]:
-            alleles+=gtype.replace('/','')
-    maf=min(alleles.count('0'),alleles.count('1'))/float(len(alleles))
-    return maf
+def CalcMafFromGtypes(dosages):
+    # minor allele frequency of every row of a dosage matrix
+    nalleles = 2*dosages.shape[1]
+    alt = dosages.sum(axis=1,dtype=int)
+    return numpy.minimum(alt,nalleles-alt)/float(nalleles)
 
-def BuildGtypeOutString(gtype_dict):
-    gtype_string_dict = {'0/0':'0/0:56:56,0:.,77.63,.','0/1':'0/1:46:22,24:.,63.77,.','1/1':'1/1:23:0,23:.,31.88,.'}
-    gtype_list = []
-    for gtype in gtype_dict['pop1']:
-        gtype_list.append(gtype_string_dict[gtype])
-    for gtype in gtype_dict['pop2']:
-        gtype_list.append(gtype_string_dict[gtype])
-    return '\t'.join(gtype_list)  
+def RedrawLowMafSnps(dosages,freq1,freq2,gtypes1,gtypes2,minmaf=0.05,maxrounds=1000,rng=numpy.random):
+    # rejection sampling in batches: each round redraws, in one call, the genotypes of all SNPs whose simulated
+    # MAF is still below minmaf. Returns the indices of SNPs still failing after maxrounds and the total number
+    # of genotype sets drawn, including the initial one per SNP
+    failing = numpy.flatnonzero(CalcMafFromGtypes(dosages) < minmaf)
+    ndraws = len(dosages)
+    rounds = 0
+    while len(failing) > 0 and rounds < maxrounds:
+        redrawn = GenerateGenotypesFromFrequencies(freq1[failing],freq2[failing],gtypes1,gtypes2,rng)
+        dosages[failing] = redrawn
+        ndraws += len(failing)
+        failing = failing[CalcMafFromGtypes(redrawn) < minmaf]
+        rounds += 1
+    return failing,ndraws
+
+gtype_strings = numpy.array(['0/0:56:56,0:.,77.63,.','0/1:46:22,24:.,63.77,.','1/1:23:0,23:.,31.88,.'],dtype=object)
+
+def OpenVcfOut(vcfname,bgzip=False,buffersize=1<<20):
+    # large write buffer; with bgzip, output is piped through the bgzip executable so it can be indexed with tabix
+    if not bgzip:
+        return open(vcfname,'w',buffersize),None
+    gzout = open(vcfname,'wb')
+    proc = subprocess.Popen(['bgzip','-c'],stdin=subprocess.PIPE,stdout=gzout,bufsize=buffersize,universal_newlines=True)
+    # bgzip has its own copy of the file handle
+    gzout.close()
+    return proc.stdin,proc
+
+def WriteVcfChunk(fout,dosages,start):
+    # formats a block of SNPs with one string operation; positions and ids run from start+1
+    nsnps,ngtypes = dosages.shape
+    fields = numpy.empty((nsnps,ngtypes+2),dtype=object)
+    fields[:,0] = fields[:,1] = numpy.arange(start+1,start+nsnps+1)
+    fields[:,2:] = gtype_strings[dosages]
+    line = 'un\t%d\t%d\tC\tA\t.\tPASS\t.\tGT:DP:AD:GL' + '\t%s' * ngtypes + '\n'
+    fout.write((line * nsnps) % tuple(fields.ravel()))
 
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description='takes table of minor allele frequencies sampled from 2DSFS to produce a fake vcf file')
-    parser.add_argument('-i','--sfs-infile',dest='sfs',type=str,help='filename of tab-separated allele counts')
+    parser.add_argument('-i','--sfs-infile',dest='sfs',type=str,help='filename of tab-separated allele counts, one line per SNP or, with a third count column, one line per spectrum cell')
     parser.add_argument('-a1','--pop1_downprojected_alleles',dest='a1',type=int,help='number of alleles dadi downprojected population 1')
     parser.add_argument('-a2','--pop2_downprojected_alleles',dest='a2',type=int,help='number of alleles dadi downprojected population 2')
     parser.add_argument('-d1','--pop1_ndiploids',dest='d1',type=int,help='number of diploid genotypes to sample from frequencies')
     parser.add_argument('-d2','--pop2_ndiploids',dest='d2',type=int,help='number of diploid genotypes to sample from frequencies')
     parser.add_argument('-vout','--vcfout',dest='vcfout',type=str,help='name of output vcf file')
+    parser.add_argument('-maxr','--max-redraw-rounds',dest='maxr',type=int,default=1000,help='maximum number of rounds of redrawing genotypes for SNPs with simulated MAF < 0.05; SNPs still failing are dropped')
+    parser.add_argument('-bgz','--bgzip',dest='bgzip',action='store_true',help='compress output vcf with bgzip (must be in PATH)')
+    parser.add_argument('-chunk','--chunk-size',dest='chunk',type=int,default=10000,help='number of SNPs formatted and written at a time')
+    parser.add_argument('-prog','--progress-interval',dest='progress',type=int,default=100000,help='report number of SNPs written every this many SNPs; 0 to disable')
+    parser.add_argument('-seed','--seed',dest='seed',type=int,default=None,help='random seed; by default a new seed is drawn and reported')
     opts = parser.parse_args()
+    if opts.seed is None:
+        opts.seed = RandomStreams.NewSeed()
+    print 'random seed:', opts.seed
+    rng = RandomStreams.Stream(opts.seed,'genotypes')
     ids = []
     for i in range(opts.d1):
         ids.append('ECO%s' % str(i+1))
@@ -66,28 +94,34 @@ if __name__ == "__main__":
     idstring = '\t'.join(ids)
     header = '##fileformat=VCFv4.0\n##fileDate=20161107\n##source="Stacks v1.32"\n##INFO=<ID=NS,Number=1,Type=Integer,Description="Number of Samples With Data">\n##INFO=<ID=AF,Number=.,Type=Float,Description="Allele Frequency">\n##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read Depth">\n##FORMAT=<ID=AD,Number=1,Type=Integer,Description="Allele Depth">\n##FORMAT=<ID=GL,Number=.,Type=Float,Description="Genotype Likelihood">\n'
 
-    fout = open(opts.vcfout,'w')
+    fout,bgzip_proc = OpenVcfOut(opts.vcfout,opts.bgzip)
     fout.write(header)
     fout.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t%s\n' % idstring)
 
-    sfsin = open(opts.sfs,'r')
-    counter = 0
-    labels =  sfsin.readline().strip().split('\t')
-    for line in sfsin:
-        pop1count,pop2count = [int(i) for i in line.strip().split('\t')]
-        pop1freq, pop2freq = ExtractAlleleFrequenciesFromCounts(opts.a1,opts.a2,pop1count,pop2count)
+    counts = ReadAlleleCounts(opts.sfs)
+    pop1count = numpy.repeat(counts[:,0],counts[:,2])
+    pop2count = numpy.repeat(counts[:,1],counts[:,2])
+    totalfreq = (pop1count+pop2count)/float(opts.a1+opts.a2)
+    keep = numpy.minimum(totalfreq,1-totalfreq)>=0.05
+    pop1freq, pop2freq = ExtractAlleleFrequenciesFromCounts(opts.a1,opts.a2,pop1count[keep],pop2count[keep])
 
-        if min((pop1count+pop2count)/float(opts.a1+opts.a2),1-(pop1count+pop2count)/float(opts.a1+opts.a2))>=0.05:
-            counter+=1
-            print 'counter ==', counter
-            mafpass = 0
-            while mafpass == 0:
-                gtypes = GenerateGenotypesFromFrequencies(pop1freq,pop2freq,opts.d1,opts.d2)
-                if CalcMafFromGtypes(gtypes) >= 0.05:
-                    mafpass += 1
-                    gtypes_formatted = BuildGtypeOutString(gtypes)
-                    fout.write('un\t%s\t%s\tC\tA\t.\tPASS\t.\tGT:DP:AD:GL\t%s\n' % (counter,counter,gtypes_formatted))
+    ### genotypes for all SNPs are drawn at once; SNPs whose simulated genotypes have MAF < 0.05 are redrawn in batches ###
+    dosages = GenerateGenotypesFromFrequencies(pop1freq,pop2freq,opts.d1,opts.d2,rng)
+    failing,ndraws = RedrawLowMafSnps(dosages,pop1freq,pop2freq,opts.d1,opts.d2,maxrounds=opts.maxr,rng=rng)
+    print 'genotype sets drawn: %s, accepted: %s, acceptance rate: %.4f' % (ndraws,len(dosages)-len(failing),(len(dosages)-len(failing))/float(max(ndraws,1)))
+    if len(failing) > 0:
+        print 'dropping %s SNPs with simulated MAF < 0.05 after %s redraw rounds' % (len(failing),opts.maxr)
+        dosages = numpy.delete(dosages,failing,axis=0)
 
+    nextreport = opts.progress
+    for start in range(0,len(dosages),opts.chunk):
+        WriteVcfChunk(fout,dosages[start:start+opts.chunk],start)
+        written = min(start+opts.chunk,len(dosages))
+        if opts.progress > 0 and written >= nextreport:
+            print 'SNPs written ==', written
+            nextreport = (written//opts.progress+1)*opts.progress
 
-fout.close()
-                
+    fout.close()
+    if bgzip_proc is not None and bgzip_proc.wait() != 0:
+        sys.exit('bgzip exited with status %s; %s is incomplete' % (bgzip_proc.returncode,opts.vcfout))
+    print 'wrote %s SNPs to %s' % (len(dosages),opts.vcfout)
@@ -0,0 +1,62 @@
+import numpy
+
+'''
+Sampling of per-SNP allele counts from a two-population joint SFS, shared by the
+ForestVsEctoneSamplingFromSpectra scripts. Must be in the same working directory
+as those scripts.
+
+All samples are drawn with one numpy call and converted to (pop1, pop2) allele
+counts with unravel_index, so the cost no longer depends on Python loops over
+spectrum cells or SNPs, and the flattened size comes from the spectrum itself
+rather than from a fixed projection.
+
+SampleSfsCounts draws the same kind of data set as a single multinomial count
+vector over the flattened spectrum and returns only the occupied cells with their
+SNP counts, so memory and time scale with the number of non-zero cells rather
+than the number of simulated SNPs. WriteCellCounts writes these as a third,
+'count', column that FromJointFreqToVcf.py accepts in place of one line per SNP.
+
+Both take an optional rng (e.g. a RandomStreams.Stream), defaulting to the global
+numpy.random state.
+'''
+
+def SpectrumProbabilities(sfs):
+    # normalize counts by the sum of the spectrum; masked cells get probability 0
+    probs = sfs/numpy.sum(sfs)
+    return numpy.ma.filled(probs,0)
+
+def SampleSfs(probs,nsamples=56055,rng=numpy.random):
+    # returns an (nsamples, 2) integer array of allele counts. Counts are the
+    # spectrum index + 1, as in the indexing array of the original scripts, so
+    # simulated data sets stay comparable with those already generated
+    flat = probs.ravel()
+    samples = rng.choice(flat.size,size=nsamples,p=flat)
+    return numpy.column_stack(numpy.unravel_index(samples,probs.shape)) + 1
+
+def SampleSfsCounts(probs,nsamples=56055,rng=numpy.random):
+    # returns the (ncells, 2) allele counts of cells with at least one SNP, using
+    # the same index + 1 offset as SampleSfs, and the number of SNPs in each cell
+    flat = probs.ravel()
+    counts = rng.multinomial(nsamples,flat/numpy.sum(flat))
+    cells = numpy.flatnonzero(counts)
+    return numpy.column_stack(numpy.unravel_index(cells,probs.shape)) + 1, counts[cells]
+
+def WriteAlleleCounts(outname,samples,labels):
+    fout = open(outname,'w')
+    fout.write('%s\n' % '\t'.join(labels))
+    fout.write(('%d\t%d\n' * len(samples)) % tuple(samples.ravel()))
+    fout.close()
+
+def WriteCellCounts(outname,cells,counts,labels):
+    fout = open(outname,'w')
+    fout.write('%s\tcount\n' % '\t'.join(labels))
+    table = numpy.column_stack((cells,counts))
+    fout.write(('%d\t%d\t%d\n' * len(table)) % tuple(table.ravel()))
+    fout.close()
+
+def ReplicateName(outname,replicate,nreplicates):
+    # keep the original file name when only one data set is simulated
+    if nreplicates == 1:
+        return outname
+    stem,ext = outname.rsplit('.',1)
+    return '%s_rep%s.%s' % (stem,replicate,ext)
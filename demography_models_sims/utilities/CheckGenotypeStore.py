@@ -0,0 +1,85 @@
+import os
+import sys
+import shutil
+import tempfile
+import numpy
+import GenotypeStore
+
+'''
+usage: python CheckGenotypeStore.py
+
+Requires GenotypeStore.py in the same working directory, and
+summarizemissing_by_ind.py in ../../variant_filtering/scripts, as in this
+repository.
+
+Checks GenotypeStore.py on a small vcf with unphased, phased, missing,
+half-missing and phased-missing calls, with and without FORMAT fields after GT:
+-the stored ALT allele counts, with -1 for every call with a missing allele,
+-that summarizemissing_by_ind.py gives the same per-individual and per-site
+ missing counts from the vcf and from the store,
+-that a vcf with a multiallelic genotype is not converted.
+Prints each failed check and exits with status 1 if any check fails.
+'''
+
+Header = '##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tind1\tind2\tind3\tind4\n'
+
+# sites of the test vcf, and the ALT allele counts each genotype is stored as
+Sites = [('1','100','7','A','G',['0/0','0/1','1/1','./.'],[0,1,2,-1]),
+    ('1','200','7','C','T',['0|1','1|0','.|.','./1'],[1,1,-1,-1]),
+    ('1','300','8','G','A',['0/0:12','./.:0','1/.:3','.:0'],[0,-1,-1,-1]),
+    ('2','50','9','T','C',['1|1:8','0/0:9','.|1:1','0|0:7'],[2,0,-1,0])]
+
+def WriteVcf(vcfname,sites):
+    vcfout = open(vcfname,'w')
+    vcfout.write(Header)
+    for chrom,pos,locus,ref,alt,gtypes,codes in sites:
+        fmt = 'GT:DP' if ':' in gtypes[0] else 'GT'
+        vcfout.write('\t'.join([chrom,pos,locus,ref,alt,'.','PASS','.',fmt] + gtypes) + '\n')
+    vcfout.close()
+
+def Check(failures,ok,message):
+    if not ok:
+        print('FAILED: %s' % message)
+        failures.append(message)
+
+if __name__=="__main__":
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','..','variant_filtering','scripts'))
+    import summarizemissing_by_ind
+
+    failures = []
+    workdir = tempfile.mkdtemp(prefix='check_genotypestore_')
+    try:
+        vcfname = os.path.join(workdir,'test.vcf')
+        prefix = os.path.join(workdir,'test')
+        WriteVcf(vcfname,Sites)
+        GenotypeStore.ConvertVcf(vcfname,prefix,chunksize=3)
+        genotypes,sites,samples = GenotypeStore.LoadGenotypes(prefix)
+        expected = numpy.array([site[6] for site in Sites],dtype=numpy.int8)
+        Check(failures,numpy.array_equal(genotypes,expected),'stored genotypes\n%s\nexpected\n%s' % (genotypes,expected))
+        Check(failures,samples == ['ind1','ind2','ind3','ind4'],'sample ids %s' % samples)
+        Check(failures,[list(site[:5]) for site in sites] == [list(site[:5]) for site in Sites],'sites %s' % sites)
+
+        vcf_sites = open(os.path.join(workdir,'vcf_sites.txt'),'w')
+        vcf_ids,vcf_counts,vcf_nsites = summarizemissing_by_ind.CountMissing(vcfname,3,vcf_sites)
+        vcf_sites.close()
+        store_sites = open(os.path.join(workdir,'store_sites.txt'),'w')
+        store_ids,store_counts,store_nsites = summarizemissing_by_ind.CountMissingStore(prefix,3,store_sites)
+        store_sites.close()
+        Check(failures,vcf_ids == store_ids and vcf_nsites == store_nsites,'samples or number of sites of vcf and store differ')
+        Check(failures,list(vcf_counts) == list((expected < 0).sum(axis=0)),'missing counts per individual from the vcf: %s' % vcf_counts)
+        Check(failures,list(vcf_counts) == list(store_counts),'missing counts per individual, vcf %s, store %s' % (vcf_counts,store_counts))
+        Check(failures,open(os.path.join(workdir,'vcf_sites.txt')).read() == open(os.path.join(workdir,'store_sites.txt')).read(),'per-site missing counts of vcf and store differ')
+
+        WriteVcf(vcfname,Sites + [('2','80','10','A','C,G',['0/2','0/0','1/1','./.'],None)])
+        try:
+            GenotypeStore.ConvertVcf(vcfname,prefix)
+            Check(failures,False,'a multiallelic site was converted')
+        except ValueError as e:
+            Check(failures,'2:80' in str(e),'error for a multiallelic site does not name it: %s' % e)
+    finally:
+        shutil.rmtree(workdir)
+
+    if len(failures) > 0:
+        print('%s checks failed' % len(failures))
+        sys.exit(1)
+    print('all genotype store checks passed')
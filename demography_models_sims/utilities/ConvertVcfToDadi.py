@@ -1,5 +1,5 @@
-from collections import defaultdict
 import argparse
+import numpy
 
 def BuildStrataDict(stratafile):
     # strata file has a header line
@@ -11,45 +11,123 @@ def BuildStrataDict(stratafile):
         strata_dict[id] = population
     return strata_dict
 
-def ParseGenotypes(vcflinedict,strata_dict):
-    allele1_dict = defaultdict(int)
-    allele2_dict = defaultdict(int)
-    for sampleid in strata_dict.keys():
-        gtype = vcflinedict[sampleid].split(':')[0]
-        allele1_dict[strata_dict[sampleid]] += gtype.count('0') 
-        allele2_dict[strata_dict[sampleid]] += gtype.count('1')
-        
-    return allele1_dict,allele2_dict
+def PopulationMembership(samples,strata_dict,pops):
+    # (nsamples, npops) 0/1 matrix assigning each vcf sample column to its population; samples not in the strata
+    # file belong to no population
+    membership = numpy.zeros((len(samples),len(pops)),dtype=int)
+    for i in range(len(samples)):
+        if samples[i] in strata_dict:
+            membership[i,pops.index(strata_dict[samples[i]])] = 1
+    return membership
 
-if __name__=="__main__":
-    parser = argparse.ArgumentParser(description="Convert Stacks-generated vcf genotypes to dadi input")
-    parser.add_argument('-strata','--strata-file',dest='strata',type=str,help='strata file, col1=id,col2=pop')
-    parser.add_argument('-vcf','--vcf-file',dest='vcf',type=str,help='vcf genotypes infile')
-    parser.add_argument('-o','--outfile',dest='out',type=str,help='name of dadi input file exported')
-    opts = parser.parse_args()
-    
-    strata_dict = BuildStrataDict(opts.strata)
-    pops = list(set(strata_dict.values()))
-    pops.sort() 
-    fout = open(opts.out,'w')
-    out_header = 'IN_GROUP\tOUT_GROUP\tAllele1\t%s\tAllele2\t%s\tMARKERS\n' % ('\t'.join(pops),'\t'.join(pops))
-    fout.write(out_header)
-    
-    fopen = open(opts.vcf,'r')
+def AlleleCodes(gtypes):
+    # counts of '0' and '1' alleles in an array of GT strings, computed once per distinct genotype string
+    gt = numpy.char.partition(gtypes,':')[...,0]
+    unique,inverse = numpy.unique(gt,return_inverse=True)
+    allele1 = numpy.array([g.count('0') for g in unique],dtype=int)[inverse].reshape(gt.shape)
+    allele2 = numpy.array([g.count('1') for g in unique],dtype=int)[inverse].reshape(gt.shape)
+    return allele1,allele2
+
+def WriteDadiLines(fout,sites,allele1_counts,allele2_counts):
+    # sites are (CHROM, POS, ID, REF, ALT); counts are (nsites, npops)
+    lines = []
+    for site,counts1,counts2 in zip(sites,allele1_counts,allele2_counts):
+        markerstring = '%s__%s__%s' % (site[0],site[2],site[1])
+        lines.append('---\t---\t%s\t%s\t%s\t%s\t%s\n' % (site[3],'\t'.join([str(c) for c in counts1]),site[4],'\t'.join([str(c) for c in counts2]),markerstring))
+    fout.write(''.join(lines))
+
+def StackedMembership(samples,strata_dicts,pops_list):
+    # membership matrices of several strata definitions side by side, so one product counts alleles for all of them;
+    # returns the matrix and the column ranges of each strata definition
+    memberships = [PopulationMembership(samples,strata_dicts[i],pops_list[i]) for i in range(len(strata_dicts))]
+    bounds = numpy.cumsum([0] + [len(pops) for pops in pops_list])
+    return numpy.hstack(memberships),[(bounds[i],bounds[i+1]) for i in range(len(pops_list))]
+
+def SplitCounts(allele1,allele2,membership,ranges):
+    allele1_counts = allele1.dot(membership)
+    allele2_counts = allele2.dot(membership)
+    return [(allele1_counts[:,start:end],allele2_counts[:,start:end]) for start,end in ranges]
+
+def IterVcfAlleleCountsMulti(vcfname,strata_dicts,pops_list,chunksize=10000,verbose=False):
+    # yields (sites, [(allele1 counts, allele2 counts) for each strata definition]) for blocks of chunksize SNPs,
+    # reading the vcf once; sites are (CHROM, POS, ID, REF, ALT) and counts are (nsites, npops) arrays. Samples
+    # missing from a strata file are not counted for it
+    fopen = open(vcfname,'r')
+    chunk = []
     for line in fopen:
         if line[:6] == '#CHROM': 
             fields = line[1:].strip().split('\t')
-            print(fields)
+            if verbose:
+                print(fields)
+            membership,ranges = StackedMembership(fields[9:],strata_dicts,pops_list)
         elif line[0] =='#':
             pass    
         else:
-            linedict = dict(zip(fields,line.strip().split()))
-            markerstring = '%s__%s__%s' % (linedict['CHROM'],linedict['ID'],linedict['POS'])    
-            allele1_dict,allele2_dict = ParseGenotypes(linedict,strata_dict)
-            allele1_counts = [str(allele1_dict[pop]) for pop in pops]
-            allele2_counts = [str(allele2_dict[pop]) for pop in pops] 
-            fout.write('---\t---\t%s\t%s\t%s\t%s\t%s\n' % (linedict['REF'],'\t'.join(allele1_counts),linedict['ALT'],'\t'.join(allele2_counts),markerstring))  
+            chunk.append(line.strip().split('\t'))
+            if len(chunk) == chunksize:
+                yield CountChunk(chunk,membership,ranges)
+                chunk = []
+    if len(chunk) > 0:
+        yield CountChunk(chunk,membership,ranges)
+    fopen.close()
+
+def CountChunk(chunk,membership,ranges):
+    allele1,allele2 = AlleleCodes(numpy.array([fields[9:] for fields in chunk]))
+    return [fields[:5] for fields in chunk],SplitCounts(allele1,allele2,membership,ranges)
+
+def IterStoreAlleleCountsMulti(prefix,strata_dicts,pops_list,chunksize=10000):
+    # same counts from a binary genotype store made with GenotypeStore.py; missing genotypes count as no alleles
+    import GenotypeStore
+    genotypes,sites,samples = GenotypeStore.LoadGenotypes(prefix)
+    membership,ranges = StackedMembership(samples,strata_dicts,pops_list)
+    for start in range(0,len(genotypes),chunksize):
+        alt = genotypes[start:start+chunksize].astype(int)
+        called = alt >= 0
+        allele1 = numpy.where(called,2-alt,0)
+        allele2 = numpy.where(called,alt,0)
+        yield sites[start:start+chunksize],SplitCounts(allele1,allele2,membership,ranges)
+
+def IterVcfAlleleCounts(vcfname,strata_dict,pops,chunksize=10000,verbose=False):
+    # single strata definition: yields (sites, allele1 counts, allele2 counts)
+    for sites,counts in IterVcfAlleleCountsMulti(vcfname,[strata_dict],[pops],chunksize,verbose):
+        yield sites,counts[0][0],counts[0][1]
+
+def IterStoreAlleleCounts(prefix,strata_dict,pops,chunksize=10000):
+    for sites,counts in IterStoreAlleleCountsMulti(prefix,[strata_dict],[pops],chunksize):
+        yield sites,counts[0][0],counts[0][1]
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="Convert Stacks-generated vcf genotypes to dadi input")
+    parser.add_argument('-strata','--strata-file',dest='strata',type=str,nargs='+',help='strata file(s), col1=id,col2=pop; with several, the vcf is read once and one dadi input file is written per strata file')
+    parser.add_argument('-vcf','--vcf-file',dest='vcf',type=str,help='vcf genotypes infile')
+    parser.add_argument('-gt','--genotype-store',dest='gt',type=str,default=None,help='prefix of a binary genotype store (GenotypeStore.py), read instead of the vcf')
+    parser.add_argument('-o','--outfile',dest='out',type=str,nargs='+',help='name(s) of dadi input file(s) exported, one per strata file')
+    parser.add_argument('-chunk','--chunk-size',dest='chunk',type=int,default=10000,help='number of vcf lines converted at a time')
+    opts = parser.parse_args()
+    if len(opts.strata) != len(opts.out):
+        parser.error('give one outfile per strata file')
     
-    fout.close()
+    strata_dicts = []
+    pops_list = []
+    fouts = []
+    for stratafile,outfile in zip(opts.strata,opts.out):
+        strata_dict = BuildStrataDict(stratafile)
+        pops = list(set(strata_dict.values()))
+        pops.sort() 
+        fout = open(outfile,'w')
+        out_header = 'IN_GROUP\tOUT_GROUP\tAllele1\t%s\tAllele2\t%s\tMARKERS\n' % ('\t'.join(pops),'\t'.join(pops))
+        fout.write(out_header)
+        strata_dicts.append(strata_dict)
+        pops_list.append(pops)
+        fouts.append(fout)
     
-
+    if opts.gt is not None:
+        counts = IterStoreAlleleCountsMulti(opts.gt,strata_dicts,pops_list,opts.chunk)
+    else:
+        counts = IterVcfAlleleCountsMulti(opts.vcf,strata_dicts,pops_list,opts.chunk,verbose=True)
+    for sites,strata_counts in counts:
+        for fout,(allele1_counts,allele2_counts) in zip(fouts,strata_counts):
+            WriteDadiLines(fout,sites,allele1_counts,allele2_counts)
+    
+    for fout in fouts:
+        fout.close()
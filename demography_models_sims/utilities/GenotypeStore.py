@@ -0,0 +1,124 @@
+import argparse
+import numpy
+
+'''
+usage: GenotypeStore.py -vcf trachylepis_RAD.vcf -o trachylepis_RAD
+       or, in a script: import GenotypeStore
+
+Converts the GT calls of a vcf, once, into a binary genotype matrix that the
+missingness and dadi conversion scripts (summarizemissing_by_ind.py,
+ConvertVcfToDadi.py and VcfToSpectrum.py, with -gt) can load without parsing text.
+SampleOneSnpPerRadLocusFromVcf.py still reads the vcf, as it writes out whole vcf
+lines, with all FORMAT fields, which the store does not keep; FromJointFreqToVcf.py
+writes vcfs and reads none. A store with prefix [prefix] consists of
+-[prefix].gt.npy: int8 (nsites, nsamples) matrix of ALT allele counts (0, 1 or 2),
+ with -1 for missing genotypes, in numpy .npy format
+-[prefix].sites.txt: CHROM, POS, ID, REF and ALT of every site, in matrix row order
+-[prefix].samples.txt: sample ids, in matrix column order
+
+A genotype is missing if any of its alleles is missing, e.g. '.', './.', './1' or
+'.|.' (MissingGenotypes(), also used by summarizemissing_by_ind.py on vcfs). Only
+biallelic sites can be stored: a genotype with an allele other than 0 or 1 stops
+the conversion with an error naming its site.
+
+LoadGenotypes(prefix) memory-maps the matrix, so it is read from disk on demand
+instead of being loaded into memory. One byte per genotype (rather than packing
+four genotypes per byte) keeps the matrix directly usable by numpy without
+unpacking.
+
+Requires this script to be in the same working directory as the scripts using it,
+or on the PYTHONPATH.
+'''
+
+def IsMissing(gt):
+    # a GT string with any missing allele ('.', './.', './1', '.|.') is a missing genotype
+    return '.' in gt
+
+def MissingGenotypes(gtypes):
+    # boolean array of missing genotypes of an array of GT strings (fields after the first ':' are ignored)
+    gt = numpy.char.partition(gtypes,':')[...,0]
+    unique,inverse = numpy.unique(gt,return_inverse=True)
+    return numpy.array([IsMissing(g) for g in unique],dtype=bool)[inverse].reshape(gt.shape)
+
+def AltCount(gt):
+    # ALT allele count of a GT string, -1 if missing; alleles other than 0 and 1 raise ValueError
+    if IsMissing(gt):
+        return -1
+    alleles = gt.replace('|','/').split('/')
+    for allele in alleles:
+        if allele not in ('0','1'):
+            raise ValueError('genotype %s is not biallelic' % gt)
+    return alleles.count('1')
+
+def GenotypeCodes(gtypes):
+    # ALT allele counts of an array of GT strings (fields after the first ':' are ignored); -1 if missing
+    gt = numpy.char.partition(gtypes,':')[...,0]
+    unique,inverse = numpy.unique(gt,return_inverse=True)
+    codes = numpy.array([AltCount(g) for g in unique],dtype=numpy.int8)
+    return codes[inverse].reshape(gt.shape)
+
+def ConvertVcf(vcfname,prefix,chunksize=10000):
+    # first pass counts sites, so the matrix can be allocated on disk before it is filled
+    nsites = 0
+    vcfin = open(vcfname,'r')
+    for line in vcfin:
+        if line[:6] == '#CHROM':
+            samples = line.strip().split('\t')[9:]
+        elif line[0] != '#':
+            nsites += 1
+    vcfin.close()
+
+    genotypes = numpy.lib.format.open_memmap(prefix + '.gt.npy',mode='w+',dtype=numpy.int8,shape=(nsites,len(samples)))
+    sitesout = open(prefix + '.sites.txt','w')
+    row = 0
+    chunk = []
+    vcfin = open(vcfname,'r')
+    for line in vcfin:
+        if line[0] == '#':
+            continue
+        chunk.append(line.rstrip('\n').split('\t'))
+        if len(chunk) == chunksize:
+            row = WriteChunk(chunk,genotypes,row,sitesout)
+            chunk = []
+    if len(chunk) > 0:
+        row = WriteChunk(chunk,genotypes,row,sitesout)
+    vcfin.close()
+    sitesout.close()
+    genotypes.flush()
+
+    samplesout = open(prefix + '.samples.txt','w')
+    samplesout.write(''.join(['%s\n' % sample for sample in samples]))
+    samplesout.close()
+    return nsites,len(samples)
+
+def WriteChunk(chunk,genotypes,row,sitesout):
+    try:
+        genotypes[row:row+len(chunk)] = GenotypeCodes(numpy.array([fields[9:] for fields in chunk]))
+    except ValueError:
+        # name the first site that cannot be stored
+        for fields in chunk:
+            try:
+                GenotypeCodes(numpy.array([fields[9:]]))
+            except ValueError as e:
+                raise ValueError('%s at %s:%s; only biallelic sites can be stored' % (e,fields[0],fields[1]))
+        raise
+    sitesout.write(''.join(['%s\n' % '\t'.join(fields[:5]) for fields in chunk]))
+    return row + len(chunk)
+
+def LoadGenotypes(prefix,mode='r'):
+    # returns the memory-mapped genotype matrix, an (nsites, 5) string array of CHROM, POS, ID, REF, ALT and
+    # the list of sample ids
+    genotypes = numpy.load(prefix + '.gt.npy',mmap_mode=mode)
+    sites = numpy.loadtxt(prefix + '.sites.txt',dtype=str,delimiter='\t',ndmin=2,comments=None)
+    samples = [line.strip() for line in open(prefix + '.samples.txt','r')]
+    return genotypes,sites,samples
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="convert vcf genotypes to a memory-mappable binary genotype store")
+    parser.add_argument('-vcf','--vcf-file',dest='vcf',type=str,help='vcf genotypes infile')
+    parser.add_argument('-o','--out-prefix',dest='prefix',type=str,help='prefix of genotype store files')
+    parser.add_argument('-chunk','--chunk-size',dest='chunk',type=int,default=10000,help='number of vcf lines parsed at a time')
+    opts = parser.parse_args()
+
+    nsites,nsamples = ConvertVcf(opts.vcf,opts.prefix,opts.chunk)
+    print('wrote %s sites x %s samples to %s.gt.npy' % (nsites,nsamples,opts.prefix))
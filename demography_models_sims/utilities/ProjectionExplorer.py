@@ -0,0 +1,116 @@
+import os
+import argparse
+import itertools
+import numpy
+import VcfToSpectrum
+
+'''
+usage: ProjectionExplorer.py -snps dadi_forVseco_input_20170915_141444.tsv -pops ECO FOR -grid 60:110:1 150:230:1
+       (or -vcf/-gt with -strata, as in VcfToSpectrum.py)
+
+Evaluates the number of segregating sites in the folded spectrum (fs.S()) for every
+combination of candidate projection sizes in one sweep, to choose down-projections
+(as with dadi_2D_00_projections.py, one spectrum at a time). Each -grid entry is
+start:stop:step (inclusive) or a comma-separated list of sizes, in alleles, for one
+population.
+
+Allele counts are read once and SNPs with the same called and ALT counts are
+pooled. A projection keeps a SNP as segregating unless all projected alleles are
+REF or all are ALT, so S only needs the probabilities of those two outcomes, which
+are looked up, for all SNP configurations at once, in hypergeometric projection
+coefficient tables. There is one table per (sample size, projection size) pair,
+with a row per ALT count; tables are computed once and saved as .npy files in a
+cache directory, and are reused by later sweeps.
+
+Requires VcfToSpectrum.py and ConvertVcfToDadi.py in the same working directory or
+on the PYTHONPATH.
+'''
+
+_tables = {}
+
+def ProjectionTable(proj_from,proj_to,cache_dir='projection_cache'):
+    # (proj_from+1, proj_to+1) coefficients; row h is the projection of a SNP with h ALT alleles
+    key = (proj_from,proj_to)
+    if key in _tables:
+        return _tables[key]
+    tablename = None
+    if cache_dir is not None:
+        tablename = os.path.join(cache_dir,'proj_%s_to_%s.npy' % key)
+        if os.path.exists(tablename):
+            _tables[key] = numpy.load(tablename)
+            return _tables[key]
+    table = VcfToSpectrum.ProjectionCoefficients(proj_to,numpy.repeat(proj_from,proj_from+1),numpy.arange(proj_from+1))
+    if tablename is not None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        #write then rename, so other processes never read a partial file
+        tmpname = '%s.%s.tmp.npy' % (tablename[:-4],os.getpid())
+        numpy.save(tmpname,table)
+        os.rename(tmpname,tablename)
+    _tables[key] = table
+    return table
+
+def MonomorphicProbabilities(called,derived,proj_to,cache_dir='projection_cache'):
+    # probabilities that all proj_to projected alleles are REF, and that all are ALT, for every configuration
+    p_ref = numpy.zeros(len(called))
+    p_alt = numpy.zeros(len(called))
+    for proj_from in numpy.unique(called):
+        if proj_from < proj_to:
+            continue
+        rows = called == proj_from
+        table = ProjectionTable(int(proj_from),proj_to,cache_dir)
+        p_ref[rows] = table[derived[rows],0]
+        p_alt[rows] = table[derived[rows],proj_to]
+    return p_ref,p_alt
+
+def ParseGrid(grid):
+    if ':' in grid:
+        start,stop,step = [int(x) for x in grid.split(':')]
+        return list(range(start,stop+1,step))
+    return [int(x) for x in grid.split(',')]
+
+def SweepProjections(called,derived,grids,cache_dir='projection_cache'):
+    # returns a list of (projection, S) for every combination of candidate sizes
+    configs,counts = numpy.unique(numpy.hstack((called,derived)),axis=0,return_counts=True)
+    npops = len(grids)
+    probs = []
+    for i in range(npops):
+        probs.append(dict([(proj_to,MonomorphicProbabilities(configs[:,i],configs[:,npops+i],proj_to,cache_dir)) for proj_to in grids[i]]))
+    results = []
+    for projection in itertools.product(*grids):
+        p_ref = numpy.ones(len(configs))
+        p_alt = numpy.ones(len(configs))
+        kept = numpy.ones(len(configs))
+        for i in range(npops):
+            pop_ref,pop_alt = probs[i][projection[i]]
+            p_ref *= pop_ref
+            p_alt *= pop_alt
+            kept *= (configs[:,i] >= projection[i])
+        results.append((list(projection),numpy.sum(counts*(kept-p_ref-p_alt))))
+    return results
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="number of segregating sites for a grid of candidate down-projections")
+    parser.add_argument('-vcf','--vcf-file',dest='vcf',type=str,default=None,help='vcf genotypes infile')
+    parser.add_argument('-gt','--genotype-store',dest='gt',type=str,default=None,help='prefix of a binary genotype store, read instead of the vcf')
+    parser.add_argument('-snps','--snps-file',dest='snps',type=str,default=None,help='dadi SNPs input file, read instead of the vcf')
+    parser.add_argument('-strata','--strata-file',dest='strata',type=str,default=None,help='strata file, col1=id,col2=pop; required with -vcf and -gt')
+    parser.add_argument('-pops','--pop-ids',dest='pops',type=str,nargs='+',help='populations')
+    parser.add_argument('-grid','--grid',dest='grid',type=str,nargs='+',help='candidate projection sizes for each population, start:stop:step or comma-separated')
+    parser.add_argument('-cache','--cache-dir',dest='cache',type=str,default='projection_cache',help='directory of cached projection tables')
+    parser.add_argument('-o','--outfile',dest='out',type=str,default='projection_sweep.txt',help='table of projections and segregating sites, best first')
+    opts = parser.parse_args()
+
+    if opts.snps is not None:
+        called,derived = VcfToSpectrum.ReadDadiCounts(opts.snps,opts.pops)
+    else:
+        called,derived = VcfToSpectrum.ReadVcfCounts(opts.gt or opts.vcf,opts.strata,opts.pops,store=opts.gt is not None)
+    results = SweepProjections(called,derived,[ParseGrid(grid) for grid in opts.grid],opts.cache)
+    results.sort(key=lambda result: -result[1])
+
+    fout = open(opts.out,'w')
+    fout.write('%s\tsegregating_sites\n' % '\t'.join(opts.pops))
+    for projection,S in results:
+        fout.write('%s\t%s\n' % ('\t'.join([str(p) for p in projection]),round(S,2)))
+    fout.close()
+    print('%s projections evaluated; best: %s with %s segregating sites' % (len(results),results[0][0],round(results[0][1],2)))
@@ -0,0 +1,51 @@
+import hashlib
+import zlib
+import numpy
+
+'''
+usage: import RandomStreams
+
+Reproducible, independent random number streams for the sampling and simulation
+scripts. Must be in the same working directory as the script using it, or on the
+PYTHONPATH.
+
+Every stream is identified by a run seed and a path, e.g. Stream(seed, 'replicate', 3)
+or Stream(seed, 'shard', 12). Streams for different paths are statistically
+independent, and the same seed and path always give the same stream, regardless of
+which process asks for it or in what order, so parallel runs reproduce serial runs
+bit for bit as long as work is divided by path (replicate, shard) rather than by
+worker.
+
+Streams are numpy RandomState objects so the scripts keep their existing calls
+(choice, randint, binomial, multinomial). With numpy >= 1.17 each stream is an
+MT19937 bit generator seeded by numpy.random.SeedSequence(seed) spawned along the
+path; with older numpy (python 2.7), the MT19937 seed is derived from a hash of the
+seed and path.
+'''
+
+try:
+    from numpy.random import SeedSequence, MT19937
+except ImportError:
+    SeedSequence = None
+
+def PathKey(path):
+    # SeedSequence spawn keys are non-negative integers; names are hashed to integers
+    key = []
+    for step in path:
+        if isinstance(step, str):
+            key.append(zlib.crc32(step.encode('utf-8')) & 0xffffffff)
+        else:
+            key.append(int(step))
+    return tuple(key)
+
+def NewSeed():
+    # a fresh run seed, to be reported so that a run can be repeated
+    if SeedSequence is not None:
+        return SeedSequence().entropy
+    return int(numpy.random.RandomState().randint(0, 2**31-1))
+
+def Stream(seed, *path):
+    if SeedSequence is not None:
+        return numpy.random.RandomState(MT19937(SeedSequence(seed, spawn_key=PathKey(path))))
+    digest = hashlib.sha1(repr((int(seed), PathKey(path))).encode('utf-8')).hexdigest()
+    return numpy.random.RandomState(int(digest[:8], 16))
@@ -0,0 +1,135 @@
+import os
+import argparse
+import hashlib
+import numpy
+from scipy.special import gammaln
+import dadi
+import ConvertVcfToDadi
+
+'''
+usage: VcfToSpectrum.py -vcf trachylepis_RAD.vcf -strata taffinis_dadi_strata_forVecotone.tsv -pops ECO FOR -proj 91 215 -o forVeco.fs
+       or, in a script: import VcfToSpectrum
+
+Builds a folded dadi Spectrum directly from per-population allele counts, without
+writing and re-parsing a dadi SNPs input file. Counts are read from a vcf and strata
+file (or a binary genotype store made with GenotypeStore.py, -gt) with the same code
+as ConvertVcfToDadi.py, or from an existing dadi SNPs input file. SNPs with the same
+numbers of called and ALT alleles in every population are pooled, and the
+hypergeometric down-projection of all distinct configurations is computed at once,
+giving the same spectrum as dadi.Misc.make_data_dict followed by
+dadi.Spectrum.from_data_dict(..., polarized = False).
+
+CachedSpectrum() stores each spectrum as a dadi .fs file in a cache directory, keyed
+by input file (path, size and modification time), strata file, populations and
+projection, so later runs load the .fs file instead of parsing the input again:
+
+fs_1 = VcfToSpectrum.CachedSpectrum(snps1, pop_ids, proj_1)
+
+Requires ConvertVcfToDadi.py (and GenotypeStore.py for -gt) in the same working
+directory or on the PYTHONPATH.
+'''
+
+def ProjectionCoefficients(proj_to,proj_from,hits):
+    # (nsnps, proj_to+1) hypergeometric probabilities of sampling j = 0..proj_to ALT alleles when proj_to of
+    # proj_from called alleles, hits of which are ALT, are kept; rows with proj_from < proj_to are zero, as in dadi
+    proj_from = numpy.asarray(proj_from)[:,None]
+    hits = numpy.asarray(hits)[:,None]
+    j = numpy.arange(proj_to+1)[None,:]
+    valid = (proj_from >= proj_to) & (hits-j >= 0) & (hits-j <= proj_from-proj_to)
+    lncontrib = LnComb(proj_to,j) + LnComb(proj_from-proj_to,hits-j) - LnComb(proj_from,hits)
+    return numpy.where(valid,numpy.exp(numpy.where(valid,lncontrib,0)),0)
+
+def LnComb(N,k):
+    # log of N choose k; only used where 0 <= k <= N
+    N,k = numpy.broadcast_arrays(N,k)
+    k = numpy.clip(k,0,numpy.maximum(N,0))
+    N = numpy.maximum(N,0)
+    return gammaln(N+1) - gammaln(k+1) - gammaln(N-k+1)
+
+def ProjectCounts(called,derived,projections):
+    # unfolded, unmasked spectrum array from (nsnps, npops) arrays of called and ALT allele counts
+    configs,counts = numpy.unique(numpy.hstack((called,derived)),axis=0,return_counts=True)
+    npops = len(projections)
+    letters = 'abcdefgh'[:npops]
+    coefficients = [ProjectionCoefficients(projections[i],configs[:,i],configs[:,npops+i]) for i in range(npops)]
+    return numpy.einsum('z,' + ','.join(['z' + l for l in letters]) + '->' + letters,counts.astype(float),*coefficients)
+
+def SpectrumFromCounts(called,derived,pop_ids,projections):
+    fs = dadi.Spectrum(ProjectCounts(called,derived,projections),pop_ids=pop_ids,mask_corners=True)
+    return fs.fold()
+
+def ReadVcfCounts(vcfname,strata,pop_ids,chunksize=10000,store=False):
+    strata_dict = ConvertVcfToDadi.BuildStrataDict(strata)
+    if store:
+        chunks = ConvertVcfToDadi.IterStoreAlleleCounts(vcfname,strata_dict,pop_ids,chunksize)
+    else:
+        chunks = ConvertVcfToDadi.IterVcfAlleleCounts(vcfname,strata_dict,pop_ids,chunksize)
+    allele1 = []
+    allele2 = []
+    for sites,allele1_counts,allele2_counts in chunks:
+        allele1.append(allele1_counts)
+        allele2.append(allele2_counts)
+    allele1 = numpy.vstack(allele1)
+    allele2 = numpy.vstack(allele2)
+    return allele1+allele2,allele2
+
+def ReadDadiCounts(snpsfile,pop_ids):
+    # called and Allele2 counts from a dadi SNPs input file, e.g. written by ConvertVcfToDadi.py
+    fopen = open(snpsfile,'r')
+    header = fopen.readline().strip().split()
+    allele2_col = header.index('Allele2')
+    allele1_cols = [header.index(pop,2) for pop in pop_ids]
+    allele2_cols = [header.index(pop,allele2_col) for pop in pop_ids]
+    counts = numpy.loadtxt(fopen,dtype=int,usecols=allele1_cols+allele2_cols,ndmin=2,comments=None)
+    fopen.close()
+    allele1 = counts[:,:len(pop_ids)]
+    allele2 = counts[:,len(pop_ids):]
+    return allele1+allele2,allele2
+
+def SpectrumKey(infile,strata,pop_ids,projections):
+    info = os.stat(infile)
+    key = [os.path.abspath(infile),info.st_size,int(info.st_mtime),list(pop_ids),[int(p) for p in projections]]
+    if strata is not None:
+        key.append(open(strata,'r').read())
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+def CachedSpectrum(infile,pop_ids,projections,strata=None,store=False,cache_dir='spectrum_cache'):
+    # infile is a vcf (with strata), a genotype store prefix (store=True, with strata) or a dadi SNPs input file
+    statfile = infile + '.gt.npy' if store else infile
+    fsname = os.path.join(cache_dir,'data_%s.fs' % SpectrumKey(statfile,strata,pop_ids,projections))
+    if os.path.exists(fsname):
+        return dadi.Spectrum.from_file(fsname)
+    if strata is not None:
+        called,derived = ReadVcfCounts(infile,strata,pop_ids,store=store)
+    else:
+        called,derived = ReadDadiCounts(infile,pop_ids)
+    fs = SpectrumFromCounts(called,derived,pop_ids,projections)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    #write then rename, so other processes never read a partial file
+    tmpname = '%s.%s.tmp' % (fsname,os.getpid())
+    fs.to_file(tmpname)
+    os.rename(tmpname,fsname)
+    return fs
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="make a folded, down-projected dadi spectrum directly from vcf genotypes")
+    parser.add_argument('-vcf','--vcf-file',dest='vcf',type=str,default=None,help='vcf genotypes infile')
+    parser.add_argument('-gt','--genotype-store',dest='gt',type=str,default=None,help='prefix of a binary genotype store, read instead of the vcf')
+    parser.add_argument('-snps','--snps-file',dest='snps',type=str,default=None,help='dadi SNPs input file, read instead of the vcf')
+    parser.add_argument('-strata','--strata-file',dest='strata',type=str,default=None,help='strata file, col1=id,col2=pop; required with -vcf and -gt')
+    parser.add_argument('-pops','--pop-ids',dest='pops',type=str,nargs='+',help='populations, in spectrum axis order')
+    parser.add_argument('-proj','--projections',dest='proj',type=int,nargs='+',help='projection sizes in alleles, one per population')
+    parser.add_argument('-cache','--cache-dir',dest='cache',type=str,default='spectrum_cache',help='directory of cached spectra')
+    parser.add_argument('-o','--outfile',dest='out',type=str,default=None,help='also write the spectrum to this .fs file')
+    opts = parser.parse_args()
+
+    if opts.snps is not None:
+        fs = CachedSpectrum(opts.snps,opts.pops,opts.proj,cache_dir=opts.cache)
+    elif opts.gt is not None:
+        fs = CachedSpectrum(opts.gt,opts.pops,opts.proj,strata=opts.strata,store=True,cache_dir=opts.cache)
+    else:
+        fs = CachedSpectrum(opts.vcf,opts.pops,opts.proj,strata=opts.strata,cache_dir=opts.cache)
+    print('projection %s, sample sizes %s, segregating sites %s' % (opts.proj,fs.sample_sizes,fs.S()))
+    if opts.out is not None:
+        fs.to_file(opts.out)
@@ -1,28 +1,166 @@
-import sys
+import os
+import argparse
+import multiprocessing
 from collections import defaultdict
 from os.path import basename
-genotype_dict=defaultdict(list)
-from numpy.random import randint
+import numpy
+import RandomStreams
 
-vcfin=open(sys.argv[1],'r')
-vcfout=open('oneperrad_'+ basename(sys.argv[1]),'w')
-for line in vcfin:
-    if line[0]=='#':
+'''
+usage: SampleOneSnpPerRadLocusFromVcf.py trachylepis_RAD.vcf [reservoir|memory|sharded] [nshards] [-p processes] [-seed seed]
+
+Requires RandomStreams.py (demography_models_sims/utilities) in the same working
+directory or on the PYTHONPATH.
+
+Randomly selects one SNP per RAD locus (the vcf ID column) and writes the header
+and selected SNPs, in locus order, to oneperrad_[input vcf name].
+
+reservoir (default): a single pass over the vcf keeps, for every locus, only the
+number of SNPs seen so far and the byte offset of the currently selected SNP,
+replacing it with the n-th SNP of the locus with probability 1/n. The selected
+lines are then read back by seeking to their offsets, so memory grows with the
+number of loci and genotype text is never held in memory.
+memory: the original approach, holding every SNP line in memory before selecting.
+sharded: splits the SNP lines into nshards byte ranges (default 64), aligned to
+line boundaries, and reservoir samples the ranges on a pool of processes (default:
+number of cores), each range with its own random stream. Loci whose SNPs straddle a shard boundary are resolved
+when the shards are merged, by keeping the selection of each shard with
+probability proportional to its number of SNPs for that locus, so every SNP of a
+locus is still equally likely to be selected. Streams belong to shards, not to
+processes, so for a given seed and number of shards the output is the same for
+any number of processes.
+
+Without -seed a new seed is drawn and reported, so that a run can be repeated.
+'''
+
+def ReservoirSampleOffsets(vcfin,vcfout,end=None,rng=numpy.random):
+    # returns {locus: [number of SNPs, offset of selected SNP]} for lines from the current position up to byte
+    # offset end (default: end of file); header lines are written to vcfout
+    reservoir = {}
+    while end is None or vcfin.tell() < end:
+        offset = vcfin.tell()
+        line = vcfin.readline()
+        if not line:
+            break
+        if line[0:1] == b'#':
+            vcfout.write(line)
+            continue
+        locus = int(line.split(None,3)[2])
+        if locus not in reservoir:
+            reservoir[locus] = [1,offset]
+        else:
+            reservoir[locus][0] += 1
+            if rng.randint(0,reservoir[locus][0]) == 0:
+                reservoir[locus][1] = offset
+    return reservoir
+
+def WriteHeader(vcfin,vcfout):
+    # writes header lines and returns the byte offset of the first SNP line
+    while True:
+        offset = vcfin.tell()
+        line = vcfin.readline()
+        if not line or line[0:1] != b'#':
+            return offset
         vcfout.write(line)
+
+def ShardRanges(vcfin,start,nshards):
+    # splits [start, end of file) into nshards byte ranges, moving each boundary forward to the next line start
+    end = os.fstat(vcfin.fileno()).st_size
+    boundaries = [start]
+    for i in range(1,nshards):
+        vcfin.seek(max(start + (end-start)*i//nshards - 1,boundaries[-1]))
+        vcfin.readline()
+        boundaries.append(max(vcfin.tell(),boundaries[-1]))
+    boundaries.append(end)
+    return [(boundaries[i],boundaries[i+1]) for i in range(nshards) if boundaries[i] < boundaries[i+1]]
+
+def SampleShard(task):
+    vcfname,start,end,seed,shard = task
+    vcfin = open(vcfname,'rb')
+    vcfin.seek(start)
+    reservoir = ReservoirSampleOffsets(vcfin,None,end,RandomStreams.Stream(seed,'shard',shard))
+    vcfin.close()
+    return reservoir
+
+def MergeReservoirs(reservoirs,rng):
+    merged = {}
+    for reservoir in reservoirs:
+        for locus in reservoir:
+            count,offset = reservoir[locus]
+            if locus not in merged:
+                merged[locus] = [count,offset]
+            else:
+                merged[locus][0] += count
+                if rng.randint(0,merged[locus][0]) < count:
+                    merged[locus][1] = offset
+    return merged
+
+def SampleSharded(vcfname,vcfin,vcfout,nshards,processes,seed):
+    start = WriteHeader(vcfin,vcfout)
+    ranges = ShardRanges(vcfin,start,nshards)
+    tasks = [(vcfname,ranges[i][0],ranges[i][1],seed,i) for i in range(len(ranges))]
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(SampleShard,tasks)
+    finally:
+        pool.close()
+        pool.join()
+    return MergeReservoirs(results,RandomStreams.Stream(seed,'merge'))
+
+def WriteSelectedLines(vcfin,vcfout,reservoir):
+    counter = 0
+    for locus in sorted(reservoir):
+        counter+=1
+        if counter%1000==0:
+            print('processing rad locus...%s' % counter)
+        vcfin.seek(reservoir[locus][1])
+        vcfout.write(vcfin.readline())
+
+def SampleInMemory(vcfin,vcfout,rng=numpy.random):
+    genotype_dict=defaultdict(list)
+    for line in vcfin:
+        if line[0:1]==b'#':
+            vcfout.write(line)
+        else:
+           linelist=line.strip().split()
+           genotype_dict[int(linelist[2])].append(line)
+
+    keys=sorted(genotype_dict.keys())
+    print('dictionary build completed')
+
+    counter=0
+    for i in range(len(keys)):
+        counter+=1
+        if counter%1000==0:
+            print('processing rad locus...%s' % counter)
+        randselect=rng.randint(0,len(genotype_dict[keys[i]]))
+        vcfout.write(genotype_dict[keys[i]][randselect])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='randomly select one SNP per RAD locus from a vcf')
+    parser.add_argument('vcf',type=str,help='vcf infile; output is written to oneperrad_[vcf name]')
+    parser.add_argument('mode',type=str,nargs='?',default='reservoir',choices=['reservoir','memory','sharded'],help='sampling mode (default reservoir)')
+    parser.add_argument('nshards',type=int,nargs='?',default=64,help='number of byte ranges in sharded mode (default 64)')
+    parser.add_argument('-p','--processes',dest='processes',type=int,default=None,help='number of processes in sharded mode (default: number of cores)')
+    parser.add_argument('-seed','--seed',dest='seed',type=int,default=None,help='random seed; by default a new seed is drawn and reported')
+    opts = parser.parse_args()
+    if opts.seed is None:
+        opts.seed = RandomStreams.NewSeed()
+    print('random seed: %s' % opts.seed)
+
+    # binary mode, so tell/seek give byte offsets
+    vcfin=open(opts.vcf,'rb')
+    vcfout=open('oneperrad_'+ basename(opts.vcf),'wb')
+    if opts.mode == 'reservoir':
+        reservoir = ReservoirSampleOffsets(vcfin,vcfout,rng=RandomStreams.Stream(opts.seed,'reservoir'))
+        print('reservoir sampling completed, %s loci' % len(reservoir))
+        WriteSelectedLines(vcfin,vcfout,reservoir)
+    elif opts.mode == 'sharded':
+        reservoir = SampleSharded(opts.vcf,vcfin,vcfout,opts.nshards,opts.processes,opts.seed)
+        print('sharded reservoir sampling completed, %s loci' % len(reservoir))
+        WriteSelectedLines(vcfin,vcfout,reservoir)
     else:
-       linelist=line.strip().split()
-       genotype_dict[int(linelist[2])].append(line)
-          
-keys=genotype_dict.keys()
-keys.sort()    
-print('dictionary build completed')    
-   
-counter=0    
-for i in range(len(keys)):
-    counter+=1
-    if counter%1000==0:
-        print('processing rad locus...%s' % counter)
-    randselect=randint(0,len(genotype_dict[keys[i]]))
-    vcfout.write(genotype_dict[keys[i]][randselect])
-    
-vcfout.close() 
+        SampleInMemory(vcfin,vcfout,RandomStreams.Stream(opts.seed,'memory'))
+
+    vcfin.close()
+    vcfout.close()
@@ -1,21 +1,99 @@
-from collections import defaultdict
-misdict = defaultdict(int)
-fopen=open('oneperrad_trachylepis_RAD.vcf','r')
-fout=open('trachylepis_RAD_oneperrad_missingstats_by_ind.txt','w')
-fout.write('id\tmiscount\tmisfreq\n')
-
-for line in fopen:
-    if '#CHROM' in line:
-        fields = line.strip().split('\t')
-    elif line[0] == '#' and 'CHROM' not in line:
-        pass
+import argparse
+import numpy
+import GenotypeStore
+
+'''
+usage: summarizemissing_by_ind.py [-vcf oneperrad_trachylepis_RAD.vcf | -gt oneperrad_trachylepis_RAD] [-maxmis 0.25]
+
+Counts missing genotypes per individual and per site in one pass over the vcf. A
+genotype is missing if any of its alleles is missing (GT ., ./., ./1, .|., ...), as
+in GenotypeStore.py. Sample columns are read in chunks of lines into a boolean
+missing matrix, and counts are accumulated in numpy arrays; frequencies are
+relative to the number of sites and individuals in the vcf. Writes
+-the per-individual table (id, miscount, misfreq),
+-the per-site table (CHROM, POS, ID, miscount, misfreq),
+-the ids of individuals with a missing frequency <= maxmis, one per line, for
+ vcftools --keep.
+With -gt, genotypes are read instead from a binary genotype store made with
+GenotypeStore.py, giving the same counts. Requires GenotypeStore.py
+(demography_models_sims/utilities) in the same working directory or on the
+PYTHONPATH.
+'''
+
+def MissingMatrix(lines):
+    # boolean (nlines, nsamples) matrix of missing genotypes
+    return GenotypeStore.MissingGenotypes(numpy.array([line.rstrip('\n').split('\t')[9:] for line in lines]))
+
+def CountMissing(vcfname,chunksize=10000,siteout=None):
+    # returns sample ids, per-individual missing counts and number of sites; per-site counts are written to siteout
+    vcfin = open(vcfname,'r')
+    for line in vcfin:
+        if line[:6] == '#CHROM':
+            ids = line.strip().split('\t')[9:]
+            break
+    ind_counts = numpy.zeros(len(ids),dtype=int)
+    nsites = 0
+    chunk = []
+    for line in vcfin:
+        chunk.append(line)
+        if len(chunk) == chunksize:
+            nsites += AddChunk(chunk,ind_counts,siteout)
+            chunk = []
+    if len(chunk) > 0:
+        nsites += AddChunk(chunk,ind_counts,siteout)
+    vcfin.close()
+    return ids,ind_counts,nsites
+
+def AddChunk(chunk,ind_counts,siteout):
+    missing = MissingMatrix(chunk)
+    ind_counts += missing.sum(axis=0)
+    if siteout is not None:
+        site_counts = missing.sum(axis=1)
+        nind = float(missing.shape[1])
+        siteout.write(''.join(['%s\t%s\t%s\t%s\t%s\n' % (tuple(line.split('\t',3)[:3]) + (count,count/nind)) for line,count in zip(chunk,site_counts)]))
+    return len(chunk)
+
+def CountMissingStore(prefix,chunksize=10000,siteout=None):
+    genotypes,sites,ids = GenotypeStore.LoadGenotypes(prefix)
+    ind_counts = numpy.zeros(len(ids),dtype=int)
+    for start in range(0,len(genotypes),chunksize):
+        missing = genotypes[start:start+chunksize] < 0
+        ind_counts += missing.sum(axis=0)
+        if siteout is not None:
+            site_counts = missing.sum(axis=1)
+            nind = float(missing.shape[1])
+            siteout.write(''.join(['%s\t%s\t%s\t%s\t%s\n' % (tuple(site[:3]) + (count,count/nind)) for site,count in zip(sites[start:start+chunksize],site_counts)]))
+    return ids,ind_counts,len(genotypes)
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description="tabulate missing genotypes per individual and per site, and list individuals to keep")
+    parser.add_argument('-vcf','--vcf-file',dest='vcf',type=str,default='oneperrad_trachylepis_RAD.vcf',help='vcf genotypes infile')
+    parser.add_argument('-gt','--genotype-store',dest='gt',type=str,default=None,help='prefix of a binary genotype store, read instead of the vcf')
+    parser.add_argument('-ind','--ind-outfile',dest='indout',type=str,default='trachylepis_RAD_oneperrad_missingstats_by_ind.txt',help='per-individual missingness table')
+    parser.add_argument('-site','--site-outfile',dest='siteout',type=str,default='trachylepis_RAD_oneperrad_missingstats_by_site.txt',help='per-site missingness table')
+    parser.add_argument('-keep','--keep-outfile',dest='keepout',type=str,default='ids_maxmis_25pcent_keep.txt',help='ids of individuals passing the missingness threshold')
+    parser.add_argument('-maxmis','--max-missing',dest='maxmis',type=float,default=0.25,help='maximum fraction of missing genotypes for an individual to be kept')
+    parser.add_argument('-chunk','--chunk-size',dest='chunk',type=int,default=10000,help='number of vcf lines parsed at a time')
+    opts = parser.parse_args()
+
+    siteout = open(opts.siteout,'w')
+    siteout.write('CHROM\tPOS\tID\tmiscount\tmisfreq\n')
+    if opts.gt is not None:
+        ids,ind_counts,nsites = CountMissingStore(opts.gt,opts.chunk,siteout)
     else:
-        zerocount = 0
-        linedict =  dict(zip(fields,line.strip().split()))
-        for sampleid in fields[8:]:
-            if linedict[sampleid].split(':')[0] == './.':
-                misdict[sampleid]+=1
-for sampleid in misdict:
-    fout.write('%s\t%s\t%s\n' % (sampleid,misdict[sampleid],misdict[sampleid]/float(56055)))
-
-fout.close()
+        ids,ind_counts,nsites = CountMissing(opts.vcf,opts.chunk,siteout)
+    siteout.close()
+    print('%s individuals, %s sites' % (len(ids),nsites))
+
+    ind_freqs = ind_counts/float(max(nsites,1))
+    fout = open(opts.indout,'w')
+    fout.write('id\tmiscount\tmisfreq\n')
+    for sampleid,miscount,misfreq in zip(ids,ind_counts,ind_freqs):
+        fout.write('%s\t%s\t%s\n' % (sampleid,miscount,misfreq))
+    fout.close()
+
+    keepout = open(opts.keepout,'w')
+    keep = [sampleid for sampleid,misfreq in zip(ids,ind_freqs) if misfreq <= opts.maxmis]
+    keepout.write(''.join(['%s\n' % sampleid for sampleid in keep]))
+    keepout.close()
+    print('%s individuals with missing frequency <= %s written to %s' % (len(keep),opts.maxmis,opts.keepout))